@@ -0,0 +1,179 @@
+import numpy as np
+import argparse
+import datetime
+import functools
+import json
+import os
+import platform
+import subprocess
+import time
+import resultCache
+from mapKernels import constantGamma, fusedMap, guillot, lyapunovAdaptiveBatch, lyapunovBatch, lyapunovExp, lyapunovMixedBatch, parameterRecords, pierrehumbert
+from chaosSweep import chaosSweep
+from cycleDetection import lyapunovCycleBatch
+from orbitDiagram import adaptiveOrbitDiagram, orbitDensity
+from pointIndex import voxelSubsample, voxelSummary
+from lyapunovSlice import runTile
+from transferOperator import haveScipy, ulamEstimate
+import jitKernels
+
+##Benchmark suite for the map kernels, Lyapunov estimation and the compute part of the figure pipelines
+##Each benchmark is timed as the best of several repeats with the result cache switched off, and a run is saved
+##as JSON in ./benchmarks with the machine and commit so runs on the same machine can be compared:
+##    python benchmarks.py                      run everything and save
+##    python benchmarks.py -k lyapunov          run the benchmarks whose name contains lyapunov
+##    python benchmarks.py --compare A.json B.json
+
+resultDir = "./benchmarks"
+sizes = [100, 10000, 1000000]
+volumeBox = np.array([[0, 1], [20, 40], [0, 2]]) ##Map B box of the volumePlotter benchmarks
+
+def timeIt(fn, repeat = 5, minTime = 0.2):
+    '''
+    Best time per call of fn over repeat rounds, each round calling it enough times to last minTime
+    '''
+    fn() ##Warm up (numba compilation, page faults)
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    number = max(1, int(minTime/max(single, 1e-9)))
+    best = np.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start)/number)
+    return best
+
+def randomRecords(kind, n, seed = 0):
+    '''
+    n parameter records drawn from the sampling box of the map
+    '''
+    rng = np.random.default_rng(seed)
+    p1Max = 0.4 if kind == "C" else 1
+    return parameterRecords(kind, p1Max*rng.random(n), 20 + 20*rng.random(n), 2*rng.random(n))
+
+def kernelBenchmarks():
+    '''
+    Map kernels at several array sizes, plain and fused
+    '''
+    cases = {}
+    for f, p in [(constantGamma, [2.0, 30, 2.5]), (pierrehumbert, [2.0, 38, 0.6, 0.5]), (guillot, [2.0, 38, 0.6, 0.5])]:
+        for size in sizes:
+            tau = np.logspace(-3, 1, size)
+            out = np.empty(size)
+            cases["kernel.{0}.{1}".format(f.__name__, size)] = (lambda f = f, tau = tau, p = p: f(tau, p), size, "evaluations")
+            cases["kernel.fused.{0}.{1}".format(f.__name__, size)] = (lambda f = f, tau = tau, p = p, out = out: fusedMap(f, tau, p, out = out), size, "evaluations")
+    return cases
+
+def lyapunovBenchmarks():
+    '''
+    Lyapunov throughput in parameter sets per second for each estimator
+    '''
+    records = randomRecords("B", 1000)
+    single = list(records[0])
+    cases = {"lyapunov.exp.n10000": (lambda: lyapunovExp(pierrehumbert, 0, single), 1, "parameter sets"),
+             "lyapunov.batch.1000x1000": (lambda: lyapunovBatch("B", records, 0, 50, 1000), 1000, "parameter sets"),
+             "lyapunov.batch32.1000x1000": (lambda: lyapunovBatch("B", records, 0, 50, 1000, dtype = "float32"), 1000, "parameter sets"),
+             "lyapunov.mixed.1000x1000": (lambda: lyapunovMixedBatch("B", records, 0, 50, 1000), 1000, "parameter sets"),
+             "lyapunov.adaptive.1000": (lambda: lyapunovAdaptiveBatch("B", records, 0, 50, maxIter = 1000, nearZeroIter = 4000), 1000, "parameter sets"),
+             "lyapunov.cycle.1000x1000": (lambda: lyapunovCycleBatch("B", records, 0, 50, 1000), 1000, "parameter sets"),
+             "lyapunov.jit.1000x1000": (lambda: jitKernels.lyapunovBatch("B", records, 0, 50, 1000), 1000, "parameter sets")}
+    if haveScipy:
+        cases["lyapunov.ulam.2000cells"] = (lambda: ulamEstimate("B", single), 1, "parameter sets")
+    return cases
+
+@functools.lru_cache(maxsize = None)
+def volumePoints(size = 1000000):
+    '''
+    Random p1,p2,p3,lyExp rows over volumeBox for the volumePlotter benchmarks, built on first use only
+    '''
+    rng = np.random.default_rng(0)
+    return np.column_stack([volumeBox[:, 0] + rng.random((size, 3))*(volumeBox[:, 1] - volumeBox[:, 0]), rng.random(size)])
+
+def pipelineBenchmarks():
+    '''
+    End to end compute of the scripts: a chaosClassifier shard sweep, the fig5 orbit diagram and the volumePlotter reduction
+    '''
+    fixed = {"p2": 38, "p3": 0.6, "p4": 0.5}
+    return {"pipeline.chaosClassifier.2048": (lambda: chaosSweep("guillot", 2048, seed = 2023, workers = 1, shardSize = 1024, transient = 50, n = 1000,
+                                                                 sampler = "sobol"), 2048, "samples"),
+            "pipeline.chaosClassifier.2048.cycles": (lambda: chaosSweep("guillot", 2048, seed = 2023, workers = 1, shardSize = 1024, transient = 50,
+                                                                        n = 1000, sampler = "sobol", cycles = True), 2048, "samples"),
+            "pipeline.fig5.uniform": (lambda: orbitDensity(pierrehumbert, "p1", np.linspace(0, 1.5, 1000), fixed, (-0.2, 3.2), yBins = 400), 1000, "columns"),
+            "pipeline.fig5.adaptive": (lambda: adaptiveOrbitDiagram(pierrehumbert, "p1", (0, 1.5), fixed, budget = 1000), 1000, "columns"),
+            "pipeline.volumePlotter.voxel.1e6": (lambda: voxelSummary(volumePoints(), volumeBox, 48), 1000000, "points"),
+            "pipeline.volumePlotter.subsample.1e6": (lambda: voxelSubsample(volumePoints(), volumeBox, 48, 2), 1000000, "points"),
+            "pipeline.lyapunovSlice.tile64": (lambda: runTile((0, 0, "pierrehumbert", "p1", np.linspace(0, 1.25, 64), "p3", np.linspace(0, 2, 64),
+                                                               {"p2": 38}, 0, 300, 1000, False, "float64", False)), 4096, "grid points"),
+            "pipeline.lyapunovSlice.tile64.cycles": (lambda: runTile((0, 0, "pierrehumbert", "p1", np.linspace(0, 1.25, 64), "p3",
+                                                                      np.linspace(0, 2, 64), {"p2": 38}, 0, 300, 1000, False, "float64", True)),
+                                                     4096, "grid points")}
+
+def runBenchmarks(select = None, repeat = 5):
+    '''
+    Runs every benchmark whose name contains select and returns {name: {seconds, throughput, unit}}
+    '''
+    cases = {}
+    for group in (kernelBenchmarks, lyapunovBenchmarks, pipelineBenchmarks):
+        cases.update(group())
+    enabled = resultCache.enabled
+    resultCache.enabled = False ##Time the computation, not the cache
+    results = {}
+    try:
+        for name, (fn, items, unit) in cases.items():
+            if select and select not in name:
+                continue
+            seconds = timeIt(fn, repeat)
+            results[name] = {"seconds": seconds, "throughput": items/seconds, "unit": unit + "/s"}
+            print("{0:45s} {1:12.6f} s {2:14.4g} {3}/s".format(name, seconds, items/seconds, unit))
+    finally:
+        resultCache.enabled = enabled
+    return results
+
+def machineInfo():
+    '''
+    What a run was measured on, so only like with like is compared
+    '''
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"machine": platform.node(), "processor": platform.processor(), "cpus": os.cpu_count(), "python": platform.python_version(),
+            "numpy": np.__version__, "numba": jitKernels.haveNumba, "commit": commit}
+
+def saveRun(results, directory = resultDir):
+    '''
+    Saves a run as directory/<timestamp>.json and returns the filename
+    '''
+    os.makedirs(directory, exist_ok = True)
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    filename = os.path.join(directory, stamp + ".json")
+    with open(filename, "w") as file:
+        json.dump({"time": stamp, "info": machineInfo(), "results": results}, file, indent = 1)
+    return filename
+
+def compareRuns(before, after):
+    '''
+    Prints the speedup of every benchmark present in both runs, above 1 meaning after is faster
+    '''
+    runs = []
+    for filename in (before, after):
+        with open(filename) as file:
+            runs.append(json.load(file))
+    if runs[0]["info"]["machine"] != runs[1]["info"]["machine"]:
+        print("Warning: runs were made on different machines")
+    for name in sorted(set(runs[0]["results"]) & set(runs[1]["results"])):
+        speedup = runs[0]["results"][name]["seconds"]/runs[1]["results"][name]["seconds"]
+        print("{0:45s} {1:7.2f}x{2}".format(name, speedup, "  slower" if speedup < 0.95 else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks of the map kernels, Lyapunov estimators and figure pipelines")
+    parser.add_argument("-k", dest = "select", default = None, help = "only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--compare", nargs = 2, metavar = ("BEFORE", "AFTER"), help = "compare two saved runs instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compareRuns(*args.compare)
+    else:
+        print("Saved", saveRun(runBenchmarks(args.select, args.repeat)))
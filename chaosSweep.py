@@ -0,0 +1,239 @@
+import numpy as np
+import multiprocessing
+import json
+import os
+from mapKernels import getMap, guillot, lyapunovAdaptiveBatch, lyapunovBatch, lyapunovMixedBatch, parameterRecords
+from cycleDetection import lyapunovCycleBatch
+from resultCache import uncached
+from pointStore import appendStore, createStore, isStore, loadPoints, setCount, storeHeader, writeStore
+from samplers import getSampler
+
+##Sharded Monte Carlo sweep of the (p1,p2,p3) box for chaotic parameters
+##Each shard owns a generator spawned from one SeedSequence, so the points a shard draws depend only on
+##the seed and the shard index and the output is the same for any number of workers
+##sampler = "sobol" or "halton" replaces the i.i.d. points with a scrambled low discrepancy sequence (see samplers.py)
+
+samplingBoxes = {"B": [[0, 1], [20, 40], [0, 2]], ##Box used for chaoticPointsMC2.txt
+                 "C": [[0, 0.4], [20, 40], [0, 2]]} ##Box used for chaoticPointsGuillot2.txt
+
+def boxFor(kind):
+    '''
+    Returns the default sampling box [[p1min,p1max],[p2min,p2max],[p3min,p3max]] of a map
+    '''
+    f = getMap(kind)
+    return samplingBoxes["C" if f is guillot else "B"]
+
+def shardSizes(nSamples, shardSize):
+    '''
+    Splits the sample budget into shards of shardSize, the last one taking the remainder
+    '''
+    sizes = [shardSize]*(nSamples//shardSize)
+    if nSamples % shardSize:
+        sizes.append(nSamples % shardSize)
+    return sizes
+
+def sampleBox(unit, box):
+    '''
+    Scales an (n,3) array of points in the unit cube to the box, returned as (p1,p2,p3) rows
+    '''
+    box = np.asarray(box, dtype = float)
+    return box[:, 0] + unit*(box[:, 1] - box[:, 0])
+
+def estimate(kind, records, x0, transient, n, adaptive = False, dtype = "float64", cycles = False):
+    '''
+    Lyapunov exponents of the records with the estimator the sweeps and slices are asked for
+    dtype = "float32" runs single precision with float64 rechecks of doubtful lanes, adaptive stops each lane
+    once the sign of lambda is clear, with n then the iteration cap, and cycles stops lanes that settle on a
+    short cycle or escape (see lyapunovCycleBatch)
+    '''
+    if dtype == "float32":
+        return lyapunovMixedBatch(kind, records, x0, transient = transient, n = n)[0]
+    if adaptive:
+        return lyapunovAdaptiveBatch(kind, records, x0, transient = transient, maxIter = n, nearZeroIter = 4*n)[0]
+    if cycles:
+        return lyapunovCycleBatch(kind, records, x0, transient, n)[0]
+    return lyapunovBatch(kind, records, x0, transient = transient, n = n)
+
+def runShard(task):
+    '''
+    Classifies one shard and returns (shard index, (m,4) array of chaotic p1,p2,p3,lyExp)
+    '''
+    index, rootSeq, seedSeq, start, n, sampler, kind, box, p4, transient, nIter, adaptive, dtype, cycles = task
+    points = sampleBox(getSampler(sampler)(rootSeq, seedSeq, start, n, 3), box)
+    records = parameterRecords(kind, points[:, 0], points[:, 1], points[:, 2], p4)
+    with uncached(): ##The sweep keeps its own output, shards would only fill the cache
+        lyExp = estimate(kind, records, 0, transient, nIter, adaptive, dtype, cycles)
+    chaotic = lyExp > 0
+    return index, np.column_stack([points[chaotic], lyExp[chaotic]])
+
+def shardTasks(kind, nSamples, seed, shardSize, box, p4, transient, n, adaptive = False, firstShard = 0, sampler = "uniform", dtype = "float64",
+               cycles = False):
+    '''
+    Builds one task per shard from firstShard onwards, each carrying the root and its own spawned SeedSequence
+    and the index of its first point in the whole run
+    seed may be an int, None or the entropy recorded in a checkpoint
+    '''
+    sizes = shardSizes(nSamples, shardSize)
+    root = np.random.SeedSequence(seed)
+    seeds = root.spawn(len(sizes))
+    starts = np.concatenate([[0], np.cumsum(sizes)]).astype(int).tolist()
+    return [(i, root, seeds[i], starts[i], sizes[i], sampler, kind, box, p4, transient, n, adaptive, dtype, cycles)
+            for i in range(firstShard, len(sizes))]
+
+def orderedShards(tasks, workers):
+    '''
+    Runs the shard tasks and yields (index, points) in shard order
+    Shards are handed to a pool of workers one at a time as they free up, so slow chaotic shards do not hold up the rest,
+    and shards finishing early are held back until every shard before them is done
+    workers = 1 runs in process, None uses every core
+    '''
+    if workers == 1:
+        for task in tasks:
+            yield runShard(task)
+        return
+    if not tasks:
+        return
+    waiting = {}
+    nextIndex = tasks[0][0]
+    with multiprocessing.Pool(workers) as pool:
+        for index, points in pool.imap_unordered(runShard, tasks, chunksize = 1):
+            waiting[index] = points
+            while nextIndex in waiting:
+                yield nextIndex, waiting.pop(nextIndex)
+                nextIndex += 1
+
+def chaosSweep(kind, nSamples, seed = None, workers = None, shardSize = 1000, box = None, p4 = 0.5, transient = 50, n = 1000, adaptive = False,
+               sampler = "uniform", dtype = "float64", cycles = False):
+    '''
+    Samples nSamples points of the parameter box and returns the chaotic ones as an (m,4) array of p1,p2,p3,lyExp
+    Results come back in shard order, making the output independent of workers for a fixed seed
+    adaptive = True stops each point's Lyapunov estimate early once it has settled (see lyapunovAdaptiveBatch)
+    sampler is "uniform", "sobol" or "halton"
+    dtype = "float32" classifies in single precision, rechecking lanes near zero and a periodic sample in float64
+    cycles = True stops points that settle on a short cycle, which saves most of the work on mostly regular boxes
+    '''
+    kind = getMap(kind).__name__ ##Functions defined in mapKernels pickle by name
+    if box is None:
+        box = boxFor(kind)
+    tasks = shardTasks(kind, nSamples, seed, shardSize, box, p4, transient, n, adaptive, sampler = sampler, dtype = dtype, cycles = cycles)
+    results = [points for index, points in orderedShards(tasks, workers)]
+    if not results:
+        return np.empty((0, 4))
+    return np.concatenate(results)
+
+def chaoticVolume(kind, nSamples, seed = None, sampler = "sobol", box = None, **sweepArgs):
+    '''
+    Estimates the chaotic fraction of the parameter box and the volume it occupies
+    With a low discrepancy sampler the error of the fraction falls roughly as nSamples^-1/2 to nSamples^-2/3, the
+    chaotic region being an indicator with a rough boundary rather than a smooth integrand
+    Use a power of 2 for nSamples with Sobol, whose shards are then 1024 points unless shardSize is given
+    Returns (fraction, volume, chaotic points)
+    '''
+    if box is None:
+        box = boxFor(kind)
+    if sampler == "sobol":
+        sweepArgs.setdefault("shardSize", 1024)
+    points = chaosSweep(kind, nSamples, seed, box = box, sampler = sampler, **sweepArgs)
+    fraction = len(points)/nSamples
+    return fraction, fraction*np.prod(np.diff(np.asarray(box, dtype = float), axis = 1)), points
+
+def writePoints(filename, points, header = None):
+    '''
+    Writes chaotic points in the p1,p2,p3,lyExp text format read by volumePlotter.py, or as a store if filename ends in .cpts
+    header is the metadata of a store, ignored for text
+    '''
+    if isStore(filename):
+        writeStore(filename, points, header = header or {})
+        return
+    file = open(filename, "w")
+    file.write(formatPoints(points))
+    file.close()
+
+def formatPoints(points):
+    '''
+    Formats rows of p1,p2,p3,lyExp as text lines
+    '''
+    text = "{0}, {1}, {2}, {3:.5f} \n"
+    return "".join(text.format(p1, p2, p3, lyExp) for p1, p2, p3, lyExp in points)
+
+def writeCheckpoint(filename, state):
+    '''
+    Replaces the checkpoint atomically so a crash never leaves a half written one
+    '''
+    temp = filename + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, filename)
+
+def resumableSweep(kind, nSamples, filename, seed = None, workers = None, shardSize = 1000, box = None, p4 = 0.5, transient = 50, n = 1000, adaptive = False,
+                   sampler = "uniform", dtype = "float64", cycles = False):
+    '''
+    Runs chaosSweep streaming each shard's chaotic points to filename as soon as it is done
+    After every shard the output is flushed and filename.checkpoint records the next shard, the bytes written
+    and the SeedSequence entropy, which fixes the random stream of every remaining shard
+    Calling again with the same settings resumes from the checkpoint, discarding anything written after it
+    A filename ending in .cpts is written as a binary store preallocated for nSamples rows, with the settings in its header
+    Returns the number of chaotic points in the file
+    '''
+    kind = getMap(kind).__name__
+    if box is None:
+        box = boxFor(kind)
+    box = np.asarray(box, dtype = float).tolist()
+    checkpointFile = filename + ".checkpoint"
+    settings = {"kind": kind, "nSamples": nSamples, "shardSize": shardSize, "box": box, "p4": p4, "transient": transient, "n": n, "adaptive": adaptive,
+                "sampler": sampler, "dtype": dtype, "cycles": cycles}
+    if os.path.exists(checkpointFile):
+        with open(checkpointFile) as file:
+            state = json.load(file)
+        state["settings"].setdefault("sampler", "uniform") ##Checkpoints from before samplers and dtypes were selectable
+        state["settings"].setdefault("dtype", "float64")
+        state["settings"].setdefault("cycles", False)
+        if state["settings"] != settings or (seed is not None and state["seed"] != seed):
+            raise ValueError("Checkpoint {0} was written by a sweep with different settings".format(checkpointFile))
+    else:
+        state = {"settings": settings, "seed": seed, "entropy": np.random.SeedSequence(seed).entropy,
+                 "nextShard": 0, "bytesWritten": 0, "pointsWritten": 0}
+        if isStore(filename):
+            createStore(filename, nSamples, dict(settings, seed = seed))
+        else:
+            open(filename, "w").close()
+        writeCheckpoint(checkpointFile, state)
+    tasks = shardTasks(kind, nSamples, state["entropy"], shardSize, box, p4, transient, n, adaptive, state["nextShard"], sampler, dtype, cycles)
+    if isStore(filename):
+        setCount(filename, state["pointsWritten"]) ##Drop points appended after the last checkpoint
+        for index, points in orderedShards(tasks, workers):
+            appendStore(filename, points)
+            state["nextShard"] = index + 1
+            state["pointsWritten"] += len(points)
+            writeCheckpoint(checkpointFile, state)
+        return state["pointsWritten"]
+    with open(filename, "r+b") as file:
+        file.truncate(state["bytesWritten"]) ##Drop points written after the last checkpoint
+        file.seek(state["bytesWritten"])
+        for index, points in orderedShards(tasks, workers):
+            file.write(formatPoints(points).encode())
+            file.flush()
+            os.fsync(file.fileno())
+            state["nextShard"] = index + 1
+            state["bytesWritten"] = file.tell()
+            state["pointsWritten"] += len(points)
+            writeCheckpoint(checkpointFile, state)
+    return state["pointsWritten"]
+
+def mergeRuns(filenames, output):
+    '''
+    Merges several point files into one, dropping rows whose (p1,p2,p3) appear more than once
+    A store output keeps the header settings shared by every input store (map kind, box, p4...) and lists the
+    sources; text inputs have no metadata to contribute
+    Returns the merged (m,4) array in the order rows were first seen
+    '''
+    points = np.concatenate([loadPoints(filename) for filename in filenames] + [np.empty((0, 4))])
+    _, unique = np.unique(points[:, :3], axis = 0, return_index = True)
+    points = points[np.sort(unique)]
+    headers = [storeHeader(filename) for filename in filenames if isStore(filename)]
+    header = {key: value for key, value in headers[0].items() if all(key in other and other[key] == value for other in headers[1:])} if headers else {}
+    header["sources"] = [os.path.basename(filename) for filename in filenames]
+    writePoints(output, points, header)
+    return points
@@ -0,0 +1,32 @@
+import numpy as np
+from mapKernels import defaultChunkSize, ensemble, getMap
+
+##Cobweb (staircase) diagrams built from a single orbit
+##Vertex j of a cobweb is (tau[j//2], tau[(j+1)//2]), so after iterating into the even columns of the x vertex
+##array the rest of both arrays are filled by three strided copies, without evaluating the map again, and the
+##orbit itself is returned as the zero-copy view xi[:, ::2]. Every initial condition is a lane of one ensemble
+
+def cobweb(kind, tau0, p, n, yStart = None, chunkSize = defaultChunkSize):
+    '''
+    Cobwebs of n steps from every initial condition in tau0 (p one record or one per lane)
+    yStart is where the first vertical segment starts, the diagonal (tau0) by default; the figures often start
+    on the lower axis instead
+    Returns xi, yi of shape (lanes, 2n+1), ready for plot(xi[k], yi[k]), and the (lanes, n+1) orbit as a view of xi
+    '''
+    f = getMap(kind)
+    tau, p = ensemble(tau0, p)
+    xi = np.empty((tau.size, 2*n + 1))
+    yi = np.empty((tau.size, 2*n + 1))
+    taus = xi[:, ::2] ##tau[k] is vertex 2k
+    taus[:, 0] = tau
+    with np.errstate(divide = "ignore", invalid = "ignore"): ##Orbits starting at tau = 0 take log10(0)
+        for start in range(0, tau.size, chunkSize):
+            block = taus[start:start+chunkSize]
+            pc = p[start:start+chunkSize]
+            for i in range(n):
+                block[:, i+1] = f(block[:, i], pc)
+    xi[:, 1::2] = taus[:, :-1] ##Vertical segment up from (tau[k], tau[k]) to (tau[k], tau[k+1])
+    yi[:, 1::2] = taus[:, 1:]
+    yi[:, 2::2] = taus[:, 1:] ##then across to the diagonal at (tau[k+1], tau[k+1])
+    yi[:, 0] = tau if yStart is None else yStart
+    return xi, yi, taus
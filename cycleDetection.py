@@ -0,0 +1,112 @@
+import numpy as np
+from mapKernels import ensemble, getMap, mapAndDeriv
+from resultCache import cached
+
+##Short-circuits for trajectories whose fate is already known
+##Lanes are checked every checkEvery steps. A lane whose last maxPeriod states repeat with some period k (to a
+##relative tol) is on an attracting k-cycle, so its exponent is exactly the mean of log|f'| around the cycle and
+##it needs no more iterations. Lanes that leave [tauFloor, tauCeiling] or go non-finite are flagged as collapsed
+##or diverged and stopped at the next check
+
+statusFull = 0 ##Ran the whole budget, no cycle found (chaotic or slowly converging)
+statusCycle = 1 ##Settled on an attracting cycle
+statusCollapsed = 2 ##Collapsed towards tau = 0
+statusDiverged = 3 ##Blew up or went non-finite
+
+tauFloor = 1e-300
+tauCeiling = 1e300
+
+def findPeriod(block, maxPeriod, tol = 1e-10):
+    '''
+    Smallest period k <= maxPeriod with which the last maxPeriod columns of block repeat, 0 where there is none
+    block is a (lanes, L) array of consecutive states with L >= 2*maxPeriod
+    '''
+    period = np.zeros(len(block), dtype = int)
+    last = block[:, -1:]
+    ##Only lanes whose last state recurs within maxPeriod steps can repeat, which rules out chaotic lanes in one pass
+    recurs = np.abs(block[:, -maxPeriod-1:-1] - last) <= tol*np.maximum(np.abs(last), tauFloor)
+    candidates = np.flatnonzero(recurs.any(axis = 1))
+    block = block[candidates]
+    tail = block[:, -maxPeriod:]
+    scale = tol*np.maximum(np.abs(tail), tauFloor)
+    found = np.zeros(len(block), dtype = int)
+    for k in range(1, maxPeriod + 1):
+        earlier = block[:, -maxPeriod-k:block.shape[1]-k]
+        match = (found == 0) & np.all(np.abs(tail - earlier) <= scale, axis = 1)
+        found[match] = k
+    period[candidates] = found
+    return period
+
+def escapeStatus(tau):
+    '''
+    statusCollapsed or statusDiverged for lanes that have left the physical range, statusFull otherwise
+    '''
+    status = np.full(np.shape(tau), statusFull)
+    with np.errstate(invalid = "ignore"):
+        status[tau < tauFloor] = statusCollapsed
+        status[(tau > tauCeiling) | ~np.isfinite(tau)] = statusDiverged
+    return status
+
+@cached()
+def lyapunovCycleBatch(kind, params, x0 = 0, transient = 300, n = 10000, maxPeriod = 16, tol = 1e-10, checkEvery = 128):
+    '''
+    Lyapunov exponents that stop iterating a lane as soon as it lands on a cycle of period <= maxPeriod or escapes
+    Cycle lanes get the exact exponent (1/k) sum log|f'| over the k cycle points, collapsed lanes -inf and
+    diverged lanes nan. The rest accumulate over n steps after the transient as in lyapunovBatch
+    Lanes are checked every checkEvery steps, from the last 2*maxPeriod states only, and finished lanes are dropped
+    from the working arrays rather than masked
+    Returns (exponents, status, period, iterations used)
+    '''
+    f = getMap(kind)
+    step = mapAndDeriv(f)
+    x, p = ensemble(x0, params)
+    size = x.size
+    lyExp = np.zeros(size)
+    status = np.full(size, statusFull)
+    period = np.zeros(size, dtype = int)
+    iterations = np.zeros(size, dtype = int)
+    window = 2*maxPeriod
+    checkEvery = max(checkEvery, window)
+    lanes = np.arange(size) ##Original index of each lane still running
+    total = np.zeros(size)
+    done = 0
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        while lanes.size and done < transient + n:
+            length = min(checkEvery, transient + n - done)
+            states = np.empty((lanes.size, window))
+            for i in range(length):
+                if done + i < transient:
+                    x = f(x, p)
+                else:
+                    x, slope = step(x, p)
+                    total += np.log(np.abs(slope))
+                j = i + window - length ##Slot in the window of the last states
+                if j >= 0:
+                    states[:, j] = x
+            done += length
+            iterations[lanes] = done
+            if length < window: ##Too short a final stretch to check
+                break
+            escaped = escapeStatus(states).max(axis = 1)
+            found = np.where(escaped == statusFull, findPeriod(states, maxPeriod, tol), 0)
+            for k in np.unique(found[found > 0]): ##log|f'| at the k points of each cycle
+                cycle = found == k
+                slopes = step(states[cycle, -k:].ravel(), np.repeat(p[cycle], k, axis = 0))[1]
+                lyExp[lanes[cycle]] = np.log(np.abs(slopes)).reshape(-1, k).mean(axis = 1)
+            status[lanes[found > 0]] = statusCycle
+            period[lanes] = found
+            lyExp[lanes[escaped == statusCollapsed]] = -np.inf
+            lyExp[lanes[escaped == statusDiverged]] = np.nan
+            status[lanes[escaped != statusFull]] = escaped[escaped != statusFull]
+            running = (found == 0) & (escaped == statusFull)
+            if not running.all():
+                lanes, x, p, total = lanes[running], x[running], p[running], total[running]
+        lyExp[lanes] = total/n
+    return lyExp, status, period, iterations
+
+def lyapunovCycle(f, x0, args, transient = 300, n = 10000, maxPeriod = 16, tol = 1e-10):
+    '''
+    Single trajectory version of lyapunovCycleBatch, returning (exponent, status, period, iterations used)
+    '''
+    lyExp, status, period, iterations = lyapunovCycleBatch(f, [args], x0, transient, n, maxPeriod, tol)
+    return lyExp[0], status[0], period[0], iterations[0]
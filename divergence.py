@@ -0,0 +1,53 @@
+import numpy as np
+from mapKernels import defaultChunkSize, getMap, orbit
+from resultCache import cached
+
+##Finite-time sensitivity from ensembles of perturbed trajectories
+##Instead of one copy of the orbit nudged by 1e-10 at step 300, every combination of perturbation size, insertion
+##step and sign is a lane of one ensemble, iterated together for length steps and compared with the reference
+##orbit at the same steps. Percentiles over the lanes give a divergence curve with its spread, and the pooled
+##slope of log(difference/size) before saturation estimates the growth rate
+
+@cached()
+def perturbationEnsemble(kind, p, sizes = (1e-12, 1e-10, 1e-8), starts = np.arange(300, 1300, 50), signs = (1, -1), length = 150, x0 = 0,
+                         chunkSize = defaultChunkSize):
+    '''
+    Separation from the reference orbit of x0 of every perturbed copy, perturbed by sign*size at step start
+    Returns the (len(sizes), len(starts)*len(signs), length+1) absolute differences, column 0 being the perturbation
+    itself, and the spread of the reference orbit over the steps used, the scale at which the separation saturates
+    '''
+    f = getMap(kind)
+    sizes, starts, signs = (np.atleast_1d(np.asarray(x)) for x in (sizes, starts, signs))
+    reference = orbit(f, x0, p, int(starts.max()) + length)[0]
+    windows = reference[starts[:, None] + np.arange(length + 1)] ##(starts, length+1)
+    size, start, sign = (x.ravel() for x in np.meshgrid(sizes, np.arange(len(starts)), signs, indexing = "ij"))
+    perturbed = orbit(f, windows[start, 0] + sign*size, p, length, chunkSize = chunkSize)
+    difference = np.abs(perturbed - windows[start]).reshape(len(sizes), len(starts)*len(signs), length + 1)
+    used = reference[starts.min():]
+    return difference, used.max() - used.min()
+
+def divergenceCurves(difference, sizes = (1e-12, 1e-10, 1e-8), spread = 1.0, percentiles = (10, 50, 90), saturation = 0.01):
+    '''
+    Summarises a perturbationEnsemble: the (len(sizes), len(percentiles), length+1) percentile curves of the
+    difference over the lanes of each size, and the growth rate per step
+    The rate is the least squares slope through the origin of log(difference/size) against the step, pooled over
+    every lane until its difference first reaches saturation*spread. Exact zeros (lanes that fall onto the reference
+    cycle) are left out
+    '''
+    sizes = np.asarray(sizes, dtype = float)[:, None, None]
+    curves = np.percentile(difference, percentiles, axis = 1).transpose(1, 0, 2)
+    saturated = np.maximum.accumulate(difference >= saturation*spread, axis = 2)
+    valid = ~saturated & (difference > 0)
+    step = np.broadcast_to(np.arange(difference.shape[2]), difference.shape)[valid]
+    with np.errstate(divide = "ignore"):
+        growth = np.log((difference/sizes)[valid])
+    rate = np.sum(step*growth)/np.sum(step**2) if np.any(step) else np.nan
+    return curves, rate
+
+def perturbationDivergence(kind, p, sizes = (1e-12, 1e-10, 1e-8), starts = np.arange(300, 1300, 50), signs = (1, -1), length = 150, x0 = 0,
+                           percentiles = (10, 50, 90), saturation = 0.01):
+    '''
+    perturbationEnsemble followed by divergenceCurves, returning the percentile curves per size and the growth rate
+    '''
+    difference, spread = perturbationEnsemble(kind, p, sizes, starts, signs, length, x0)
+    return divergenceCurves(difference, sizes, spread, percentiles, saturation)
@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from mapKernels import guillot
+from orbitDiagram import drawDensity, orbitDensity
 
 ##Adjust plotting defaults
 rcParams["axes.linewidth"] = 4
@@ -35,48 +37,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def guillot(tau,p):
-    '''
-    Map using the two stream solution derived in Guillot (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def nDeriv(f, x, args):
-    '''
-    Numerical derivative over a delta of 0.00001 to the right
-    '''
-    delta = f(x+0.00001, args) - f(x, args)
-    return delta/0.00001
-
-def lyapunovExp(f, x0, args):
-    '''
-    Calculates the lyapunov exponent using the method in Strogatz Ch 10
-
-    '''
-    lyExp = 0
-    x = x0
-    for i in range(1000):
-        lyExp += np.log(np.abs(nDeriv(f,x,args))) 
-        x = f(x,args)
-    lyExp /= 1000
-    return lyExp
-
 fig2, ax2 = plt.subplots(1,1, figsize = (12,8)) ##Create figure
 p1s = np.linspace(0,0.3,1000)## For orbit diagrams we want a finer granularity
 p2 = 35 ## [20,40]
@@ -84,23 +44,13 @@ p3 = 0.6 ## [0,2] but preferred to be lower
 p4 = 0.5 ##Fixed at 0.5 for some reason
 
 
-maxTau = 0
-
-for p1 in p1s:
-    for j in np.linspace(0,1,5):
-        d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))
-        p = [d,p2,p3,p4] ##Prepare parameters
-        tauArr = [j*p1*40]
-        for i in range(200): ##Iterate the map 1000 times
-            tauArr.append(guillot(tauArr[i],p)) 
-            if tauArr[i] > maxTau:
-                maxTau = tauArr[i]
-        xCoor = np.ones(len(tauArr))*p1 ##Plot all points the map visited against the p1 coordinate
-        ax2.scatter(xCoor[100:],tauArr[100:], s = 1, color = "black", alpha = 0.1)
+##Orbit diagram binned into a density raster
+yRange = (-0.5,12.5)
+counts = orbitDensity(guillot, "p1", p1s, {"p2": p2, "p3": p3, "p4": p4}, yRange, yBins = 400, nIc = 5, transient = 100, keep = 101, icScale = 40)
+drawDensity(ax2, counts, p1s, yRange, mode = "alpha", alpha = 0.25) ##Same ink as the old scatter
 
 ax2.set_xlabel("$p_1$", fontsize = axesLabelSize)
 ax2.set_ylabel("Infrared Optical Depth $\\tau$", fontsize = axesLabelSize)
-xMax = np.ceil(maxTau*10)/10
 
 
 ax2.text(0.02,10, "$p_2 = {:.0f}$".format(p2), fontsize = textSize)
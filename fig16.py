@@ -2,6 +2,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import math
 from matplotlib import rcParams
+from mapKernels import pierrehumbert, guillot
+from jitKernels import lyapunovExp
+from cobweb import cobweb
+from divergence import perturbationDivergence
+from invariantDensity import densityHistogram
 
 ##Adjust plotting defaults
 rcParams["axes.linewidth"] = 4
@@ -36,51 +41,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def guillot(tau,p):
-    '''
-    Map using the two stream solution derived in Guillot (20xx)
-    $$\gamma = 10^{p_3\tanh(\log(\frac{\tau}{p_4}))}$$
-    $$\tau_{i+1} = p_1e^{\frac{-p_2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}$$
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def nDeriv(f, x, args):
-    '''
-    Numerical derivative over a delta of 0.00001 to the right
-    '''
-    delta = f(x+0.00001, args) - f(x, args)
-    return delta/0.00001
-
-def lyapunovExp(f, x0, args):
-    '''
-    Calculates the lyapunov exponent using the method in Strogatz Ch 10
-
-    '''
-    lyExp = 0
-    x = x0
-    for i in range(300):
-        x = f(x,args)
-    for i in range(10000):
-        lyExp += np.log(np.abs(nDeriv(f,x,args))) 
-        x = f(x,args)
-    lyExp /= 10000
-    return lyExp
-
-
 ##Define Parameters of Interest
 p1 = 0.07 ##[0,1] for pierrehumbert, [1,10] for Guillot
 p2 = 35 ##[20,40]
@@ -90,24 +50,11 @@ p4 = 0.5
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 
-tauArr = [0]
-perturbedTauArr = []
-difference = []
-xi = [0]
-yi = [0]
-
-for i in range(1000):
-    tauArr.append(guillot(tauArr[i],p))
-    if i == 300:
-        perturbedTauArr.append(tauArr[-1]+1e-10)
-        difference.append(np.abs(perturbedTauArr[-1]-tauArr[-1]))
-    elif i > 300:
-        perturbedTauArr.append(guillot(perturbedTauArr[-1],p))
-        difference.append(np.abs(perturbedTauArr[-1]-tauArr[-1]))
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+##Orbit and its cobweb
+xi, yi, tauArr = [a[0] for a in cobweb(guillot, 0, p, 1000)]
+##Growth of 1e-10 perturbations
+curves, growthRate = perturbationDivergence(guillot, p, sizes = [1e-10], starts = np.arange(300, 1000, 10))
+difference = curves[0, 1] ##Median curve
 
 
 maxVal = max(tauArr)
@@ -139,6 +86,7 @@ ax[0][0].set_yticks(yTicks)
 lyExp = lyapunovExp(guillot, 0, p)
 y1 = 1e-10 * np.exp(lyExp*range(150))
 
+ax[1][0].fill_between(range(150), curves[0, 0, :150], curves[0, 2, :150], color = "black", alpha = 0.2, lw = 0)
 ax[1][0].plot(difference[:150], color = "black")
 ax[1][0].plot(range(150), y1, color = "black", ls = "--")
 ax[1][0].set_xlabel("Iteration i", fontsize = axesLabelSize)
@@ -180,10 +128,10 @@ yTicks = np.arange(0,3.1,0.5)
 ax[0][1].set_xticks(xTicks)
 ax[0][1].set_yticks(yTicks)
 
-gammas = 10**(p3*np.tanh(np.log10(tauArr)/p4))
-gammaTau = np.multiply(tauArr, gammas)
-
-bins,_,__ = ax[1][1].hist(gammaTau[100:], 50, color = "black")
+##gamma*tau density drawn as counts out of 900 samples
+edges, densities, _ = densityHistogram(guillot, p, 10**7, "gammaTau", workers = 1, gammaTauRange = (0, 8.2), bins = 50, seed = 0)
+bins = 900*densities*np.diff(edges)
+ax[1][1].stairs(bins, edges, fill = True, color = "black")
 ax[1][1].set_xlabel("$\gamma\\tau$", fontsize = axesLabelSize)
 ax[1][1].set_ylabel("Count", fontsize = axesLabelSize)
 ##ax[1][1].set_title("Histogram", fontsize = titleSize)
@@ -207,4 +155,4 @@ for axes in ax:
 plt.tight_layout()
 plt.savefig("../timeSeriesPlots/guillotTimeSeries"+str(p1)+str(p2)+str(p3)+".pdf")
 
-print(lyExp)
\ No newline at end of file
+print(lyExp, growthRate)
\ No newline at end of file
@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from mapKernels import guillot
+from cobweb import cobweb
 
 ##Adjust plotting defaults
 rcParams["axes.linewidth"] = 4
@@ -35,28 +37,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def guillot(tau,p):
-    '''
-    Map using the two stream solution derived in Guillot (20xx)
-    $$\gamma = 10^{p_3\tanh(\log(\frac{\tau}{p_4}))}$$
-    $$\tau_{i+1} = p_1e^{\frac{-p_2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}$$
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
 fig, ax = plt.subplots(3,2, figsize = (19.2,19.2))
 
 x = np.logspace(-2,2,500)
@@ -103,30 +83,13 @@ ax[0][0].plot(np.log10(x),np.log10(y5), color = "tab:blue", lw = 3)
 
 ax[0][0].plot(np.log10(x),np.log10(x), ls = "-.", color = "tab:green", lw = 3)
 
-xi = [0.4]
-yi = [0.001]
-xi2 = [0.6]
-yi2 = [0.001]
-xi3 = [1]
-yi3 = [0.001]
 p1 = 0.023
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 y2 = guillot(x,p)
 
-for i in range(200):
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p)) 
-    xi.append(yi[-1])
-    yi.append(yi[-1])
-    xi2.append(xi2[-1])
-    yi2.append(guillot(xi2[-1],p)) 
-    xi2.append(yi2[-1])
-    yi2.append(yi2[-1])
-    xi3.append(xi3[-1])
-    yi3.append(guillot(xi3[-1],p)) 
-    xi3.append(yi3[-1])
-    yi3.append(yi3[-1])
+##The three starting points are iterated together as lanes of one ensemble
+(xi, xi2, xi3), (yi, yi2, yi3), _ = cobweb(guillot, [0.4, 0.6, 1], p, 200, yStart = 0.001)
 
 
 
@@ -137,30 +100,12 @@ ax[0][1].plot(np.log10(xi3),np.log10(yi3),color = "navy", linewidth = 2, alpha =
 ax[0][1].plot(np.log10(x),np.log10(x),color = "tab:green", ls = "-.", lw = 3, zorder= 1)
 
 x = np.logspace(-2,1.5,500)
-xi = [0.35]
-yi = [0.001]
-xi2 = [0.6]
-yi2 = [0.001]
-xi3 = [1.2]
-yi3 = [0.001]
 p1 = 0.03
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 y3 = guillot(x,p)
 
-for i in range(200):
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p)) 
-    xi.append(yi[-1])
-    yi.append(yi[-1])
-    xi2.append(xi2[-1])
-    yi2.append(guillot(xi2[-1],p)) 
-    xi2.append(yi2[-1])
-    yi2.append(yi2[-1])
-    xi3.append(xi3[-1])
-    yi3.append(guillot(xi3[-1],p)) 
-    xi3.append(yi3[-1])
-    yi3.append(yi3[-1])
+(xi, xi2, xi3), (yi, yi2, yi3), _ = cobweb(guillot, [0.35, 0.6, 1.2], p, 200, yStart = 0.001)
 
 
 
@@ -173,30 +118,12 @@ ax[1][0].plot(np.log10(xi3[0:3]),np.log10(yi3[0:3]),color = "navy", linewidth =
 ax[1][0].plot(np.log10(x),np.log10(x),color = "tab:green", ls = "-.", lw = 3, zorder= 1)
 
 x = np.logspace(-2,1.5,500)
-xi = [0.05]
-yi = [0.001]
-xi2 = [0.2]
-yi2 = [0.001]
-xi3 = [1.2]
-yi3 = [0.001]
 p1 = 0.05
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 y4 = guillot(x,p)
 
-for i in range(200):
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p)) 
-    xi.append(yi[-1])
-    yi.append(yi[-1])
-    xi2.append(xi2[-1])
-    yi2.append(guillot(xi2[-1],p)) 
-    xi2.append(yi2[-1])
-    yi2.append(yi2[-1])
-    xi3.append(xi3[-1])
-    yi3.append(guillot(xi3[-1],p)) 
-    xi3.append(yi3[-1])
-    yi3.append(yi3[-1])
+(xi, xi2, xi3), (yi, yi2, yi3), _ = cobweb(guillot, [0.05, 0.2, 1.2], p, 200, yStart = 0.001)
 
 
 
@@ -207,36 +134,24 @@ ax[1][1].plot(np.log10(xi3),np.log10(yi3),color = "navy", linewidth = 2, alpha =
 ax[1][1].plot(np.log10(x),np.log10(x),color = "tab:green", ls = "-.", lw = 3, zorder= 1)
 
 x = np.linspace(0,12,500)
-xi = [1.2]
-yi = [0.001]
 p1 = 0.25
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 y5 = guillot(x,p)
 
-for i in range(200):
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi = [a[0] for a in cobweb(guillot, 1.2, p, 200, yStart = 0.001)[:2]]
 
 ax[2][0].plot(x,y5, color = "tab:blue", ls = "--", lw = 3, zorder = 3)
 ax[2][0].plot(xi,yi,color = "black", linewidth = 2, alpha = 0.7, zorder= 2)
 ax[2][0].plot(x,x,color = "tab:green", ls = "-.", lw = 3, zorder= 1)
 
 x = np.linspace(0,15,500)
-xi = [1.2]
-yi = [0.001]
 p1 = 0.5
 d = p1*np.exp(p2*(1+10**(-p3))**(-0.25))  
 p = [d,p2,p3,p4]
 y6 = guillot(x,p)
 
-for i in range(200):
-    xi.append(xi[-1])
-    yi.append(guillot(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi = [a[0] for a in cobweb(guillot, 1.2, p, 200, yStart = 0.001)[:2]]
 
 ax[2][1].plot(x,y6, color = "tab:blue", ls = "--", lw = 3, zorder = 3)
 ax[2][1].plot(xi,yi,color = "black", linewidth = 2, alpha = 0.7, zorder= 2)
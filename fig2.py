@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from mapKernels import constantGamma
+from orbitDiagram import drawDensity, orbitDensity
 ##Standard Imports
 
 ##Adjust plotting defaults
@@ -36,33 +38,18 @@ axesLabelSize = 36
 tickLabelSize = 34
 textSize = 34
 
-def radiativeMap(tau, gamma, p):
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
 fig2, ax2 = plt.subplots(1,1, figsize = (12,8)) ##Create figure
 gammas = np.linspace(0.5,5.5,500)## For orbit diagrams we want a finer granularity
 p1 = 1.5
 p2 = 30
 
-maxTau = 0
-for gamma in gammas:
-    d = p1*np.exp(p2*2**(-0.25))
-    p = [d,p2] ##Prepare parameters
-    tauArr = [0]
-    for i in range(300): ##Iterate the map 1000 times
-        tauArr.append(radiativeMap(tauArr[i],gamma,p)) 
-        if tauArr[i] > maxTau:
-            maxTau = tauArr[i]
-    xCoor = np.ones(len(tauArr))*gamma ##Plot all points the map visited against the p1 coordinate
-    gammaTauArr= []
-    for i in tauArr:
-        gammaTauArr.append(i*gamma)
-    ax2.scatter(xCoor[100:],gammaTauArr[100:], s = 1, color = "black", alpha = 0.2)
+##Orbit diagram of gamma*tau binned into a density raster
+yRange = (-0.5,10)
+counts = orbitDensity(constantGamma, "gamma", gammas, {"p1": p1, "p2": p2}, yRange, yBins = 400, nIc = 1, transient = 100, keep = 201, observable = lambda tau, gamma: gamma*tau)
+drawDensity(ax2, counts, gammas, yRange, mode = "alpha", alpha = 0.5) ##Same ink as the old scatter
 
 ax2.set_xlabel("Visible-to-IR Opacity $\gamma $", fontsize = axesLabelSize)
 ax2.set_ylabel("Visible Optical Depth $\gamma\\tau$", fontsize = axesLabelSize)
-xMax = np.ceil(maxTau*10)/10
 
 ax2.text(4.4,8, "$p_1 = {:.1f}$".format(p1), fontsize = textSize)
 ax2.text(4.4,7, "$p_2 = {:.0f}$".format(p2), fontsize = textSize)
@@ -1,7 +1,8 @@
 import numpy as np
-import math
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from mapKernels import constantGamma
+from cobweb import cobweb
 ##Standard Imports
 
 ##Adjust plotting defaults
@@ -37,55 +38,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def constantGamma(tau, p):
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/p[2] + (1 - 1/p[2])*np.exp(-p[2]*tau)))**(1/4))
-    return newTau
-
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def guillot(tau,p):
-    '''
-    Map using the two stream solution derived in Guillot (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def nDeriv(f, x, args):
-    '''
-    Numerical derivative over a delta of 0.00001 to the right
-    '''
-    delta = f(x+0.00001, args) - f(x, args)
-    return delta/0.00001
-
-def lyapunovExp(f, x0, args):
-    '''
-    Calculates the lyapunov exponent using the method in Strogatz Ch 10
-
-    '''
-    lyExp = 0
-    x = x0
-    for i in range(300):
-        x = f(x,args)
-    for i in range(10000):
-        lyExp += np.log(np.abs(nDeriv(f,x,args))) 
-        x = f(x,args)
-    lyExp /= 10000
-    return lyExp
-
-
 ##Define Parameters of Interest
 p1 = 1.5
 p2 = 30
@@ -99,15 +51,8 @@ fig.subplots_adjust(wspace=0.0, hspace = 0.25)
 x = np.linspace(-5,30,100)
 y = constantGamma(x,p)
 
-tauArr = [0]
-xi = [0]
-yi = [-5]
-for i in range(50):
-    tauArr.append(constantGamma(tauArr[-1],p))
-    xi.append(xi[-1])
-    yi.append(constantGamma(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+##Orbit and its cobweb
+xi, yi, tauArr = [a[0] for a in cobweb(constantGamma, 0, p, 50, yStart = -5)]
 
 ax[0][0].plot(x,y,color = "tab:blue", ls = "--", lw = 4, zorder= 3)
 ax[0][0].plot(x,x,color = "tab:green", ls = "-.", lw = 4,zorder= 1)
@@ -115,15 +60,7 @@ ax[0][0].plot(xi,yi,color = "black", linewidth = 2, alpha = 0.8, zorder= 2)
 
 ax[0][1].plot(tauArr, marker = 'o', color = "black")
 
-tauArr = [23.5]
-xi = [23.5]
-yi = [-5]
-for i in range(50):
-    tauArr.append(constantGamma(tauArr[-1],p))
-    xi.append(xi[-1])
-    yi.append(constantGamma(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(constantGamma, 23.5, p, 50, yStart = -5)]
 
 ax[0][0].plot(xi,yi,color = "black", linewidth = 2, alpha = 0.8, zorder= 2)
 
@@ -160,15 +97,7 @@ x = np.linspace(-1,3,100)
 y = constantGamma(x,p)
 
 
-tauArr = [0]
-xi = [0]
-yi = [-1]
-for i in range(50):
-    tauArr.append(constantGamma(tauArr[-1],p))
-    xi.append(xi[-1])
-    yi.append(constantGamma(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(constantGamma, 0, p, 50, yStart = -1)]
 
 ax[1][0].plot(x,y,color = "tab:blue", ls = "--",lw = 4, zorder= 3)
 ax[1][0].plot(x,x,color = "tab:green", ls = "-.", lw = 4, zorder= 1)
@@ -206,15 +135,7 @@ x = np.linspace(-1,3,100)
 y = constantGamma(x,p)
 
 
-tauArr = [0]
-xi = [0]
-yi = [-1]
-for i in range(50):
-    tauArr.append(constantGamma(tauArr[-1],p))
-    xi.append(xi[-1])
-    yi.append(constantGamma(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(constantGamma, 0, p, 50, yStart = -1)]
 
 ax[2][0].plot(x,y,color = "tab:blue", ls = "--", lw = 4,zorder= 3)
 ax[2][0].plot(x,x,color = "tab:green", ls = "-.", lw = 4, zorder= 1)
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
 from matplotlib.patches import Rectangle
+from mapKernels import pierrehumbert, lyapunovBatch, parameterRecords
 
 ##Adjust plotting defaults
 rcParams["axes.linewidth"] = 4
@@ -36,37 +37,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def nDeriv(f, x, args):
-    '''
-    Numerical derivative over a delta of 0.00001 to the right
-    '''
-    delta = f(x+0.00001, args) - f(x, args)
-    return delta/0.00001
-
-def lyapunovExp(f, x0, args):
-    '''
-    Calculates the lyapunov exponent using the method in Strogatz Ch 10
-
-    '''
-    lyExp = 0
-    x = x0
-    for i in range(1000):
-        lyExp += np.log(np.abs(nDeriv(f,x,args))) 
-        x = f(x,args)
-    lyExp /= 1000
-    return lyExp
-
 p1s = np.linspace(0,1.25) ## [0,1] for pierrehumbert, [1,10] for guillot
 p2 = 38 ## [20,40]
 p3 = 0.6 ## [0,2] but preferred to be lower
@@ -85,15 +55,16 @@ yMax = np.ceil(maxVal*20)/20
 x = np.linspace(0,2.5,100) ##Create the space to show the maps over
 ax1.plot(x,x,color = "tab:green", alpha = 1, ls = '-.', zorder = -1)##Plot the 1:1 line
 
+lyExps = lyapunovBatch(pierrehumbert, parameterRecords(pierrehumbert, p1s, p2, p3, p4), 1e-10, transient = 0, n = 1000) ##All curves at once
 chaoticLabel = False
 for i in range(len(p1s)):
     p1 = p1s[i]
     d = p1*np.exp(p2*(2)**(-0.25)) ##Prepare parameters
     p = [d,p2,p3,p4]
     chaotic = False
-    if lyapunovExp(pierrehumbert,1e-10,p) > 0: ##We define the map as chaotic if its lypunov exponent is positive
+    if lyExps[i] > 0: ##We define the map as chaotic if its lypunov exponent is positive
         chaotic = True
-    #print(p1, lyapunovExp(pierrehumbert,1e-10,p))
+    #print(p1, lyExps[i])
     color = "tab:blue"
     lineStyle = '--'
     if chaotic: ##Color the chaotic maps orange
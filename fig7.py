@@ -2,6 +2,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import math
 from matplotlib import rcParams
+from mapKernels import pierrehumbert
+from cobweb import cobweb
 
 ##Adjust plotting defaults
 rcParams["axes.linewidth"] = 4
@@ -36,51 +38,6 @@ axesLabelSize = 40
 tickLabelSize = 34
 textSize = 34
 
-def pierrehumbert(tau, p):
-    '''
-    Map using the two stream solution derived in Pierrehumbert (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def guillot(tau,p):
-    '''
-    Map using the two stream solution derived in Guillot (20xx)
-    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
-    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
-    p is an array of 4 values [d,p2,p3,4]
-    '''
-    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
-    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
-    return newTau
-
-def nDeriv(f, x, args):
-    '''
-    Numerical derivative over a delta of 0.00001 to the right
-    '''
-    delta = f(x+0.00001, args) - f(x, args)
-    return delta/0.00001
-
-def lyapunovExp(f, x0, args):
-    '''
-    Calculates the lyapunov exponent using the method in Strogatz Ch 10
-
-    '''
-    lyExp = 0
-    x = x0
-    for i in range(300):
-        x = f(x,args)
-    for i in range(10000):
-        lyExp += np.log(np.abs(nDeriv(f,x,args))) 
-        x = f(x,args)
-    lyExp /= 10000
-    return lyExp
-
-
 ##Define Parameters of Interest
 p1 = 0.4 ##[0,1] for pierrehumbert, [1,10] for Guillot
 p2 = 38 ##[20,40]
@@ -90,16 +47,8 @@ p4 = 0.5
 d = p1*np.exp(p2*2**(-0.25))
 p = [d,p2,p3,p4]
 
-tauArr = [0]
-xi = [0]
-yi = [0]
-
-for i in range(1000):
-    tauArr.append(pierrehumbert(tauArr[i],p))
-    xi.append(xi[-1])
-    yi.append(pierrehumbert(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+##Orbit and its cobweb
+xi, yi, tauArr = [a[0] for a in cobweb(pierrehumbert, 0, p, 1000)]
 
 
 maxVal = max(tauArr)
@@ -128,18 +77,7 @@ p4 = 0.5
 d = p1*np.exp(p2*2**(-0.25))
 p = [d,p2,p3,p4]
 
-tauArr = [0]
-xi = [0]
-yi = [0]
-
-
-
-for i in range(1000):
-    tauArr.append(pierrehumbert(tauArr[i],p))
-    xi.append(xi[-1])
-    yi.append(pierrehumbert(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(pierrehumbert, 0, p, 1000)]
 
 maxVal = max(tauArr)
 xMax = math.ceil(maxVal*10)/10 + 0.1 
@@ -163,16 +101,7 @@ p4 = 0.5
 d = p1*np.exp(p2*2**(-0.25))
 p = [d,p2,p3,p4]
 
-tauArr = [0]
-xi = [0]
-yi = [0]
-
-for i in range(1000):
-    tauArr.append(pierrehumbert(tauArr[i],p))
-    xi.append(xi[-1])
-    yi.append(pierrehumbert(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(pierrehumbert, 0, p, 1000)]
 
 maxVal = max(tauArr)
 xMax = math.ceil(maxVal*10)/10 + 0.1 
@@ -195,16 +124,7 @@ p4 = 0.5
 d = p1*np.exp(p2*2**(-0.25))
 p = [d,p2,p3,p4]
 
-tauArr = [0]
-xi = [0]
-yi = [0]
-
-for i in range(1000):
-    tauArr.append(pierrehumbert(tauArr[i],p))
-    xi.append(xi[-1])
-    yi.append(pierrehumbert(xi[-1],p))
-    xi.append(yi[-1])
-    yi.append(yi[-1])
+xi, yi, tauArr = [a[0] for a in cobweb(pierrehumbert, 0, p, 1000)]
 
 maxVal = max(tauArr)
 xMax = math.ceil(maxVal*10)/10 + 0.1 
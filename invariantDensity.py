@@ -0,0 +1,243 @@
+import numpy as np
+import multiprocessing
+import os
+from resultCache import cached
+from mapKernels import constantGamma, ensemble, getMap, iterateMap, opacityLaw
+
+##Streaming invariant densities of tau and gamma*tau for orbits far too long to store
+##Many lanes with the same parameters are iterated together, and every block of states is binned into fixed
+##(linear or log) histograms and folded into running moments before being overwritten, so memory depends on the
+##lanes, block and bins only, never on the length of the run. The accumulator is a dict of arrays holding the
+##histograms, the moments and the current lane states, so a checkpoint resumes the exact same stream, and
+##accumulators over the same bins from parallel workers merge by addition
+
+observables = ("tau", "gammaTau")
+
+def gammaTau(f, tau, p):
+    '''
+    gamma*tau of states of the map f for one parameter record p
+    '''
+    if f is constantGamma:
+        return p[2]*tau
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return opacityLaw(tau, p[2], p[3])[0]*tau
+
+def binEdges(valueRange, bins, scale = "linear"):
+    '''
+    bins + 1 edges over valueRange, evenly spaced or ("log") evenly spaced in log10, which needs a positive lower end
+    '''
+    low, high = valueRange
+    if scale == "linear":
+        return np.linspace(low, high, bins + 1)
+    if scale == "log":
+        if low <= 0:
+            raise ValueError("A log scale histogram needs a positive lower end, got {0}".format(low))
+        return np.logspace(np.log10(low), np.log10(high), bins + 1)
+    raise ValueError("Unknown histogram scale {0}, expected linear or log".format(scale))
+
+def binIndex(values, edges, scale = "linear"):
+    '''
+    Bin number, as a whole float, of values on edges from binEdges; values outside the range give < 0 or >= bins
+    '''
+    bins = len(edges) - 1
+    if scale == "log":
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            row = np.log(values)
+        low, high = np.log(edges[0]), np.log(edges[-1])
+    else:
+        row = np.array(values, dtype = float)
+        low, high = edges[0], edges[-1]
+    row -= low
+    row *= bins/(high - low)
+    return np.floor(row, out = row)
+
+def newAccumulator(kind, p, lanes = 1024, tauRange = None, gammaTauRange = None, bins = 1000, scale = "linear", seed = None, transient = 1000,
+                   pilot = 100):
+    '''
+    Starts lanes trajectories uniformly spread over [0, 2 f(0)], runs the transient and returns an empty accumulator
+    A range left as None is taken from the lanes over pilot further steps, widened by 5% on each side
+    '''
+    f = getMap(kind)
+    p = np.asarray(p, dtype = float).ravel()
+    with np.errstate(divide = "ignore"):
+        top = float(f(0.0, p))
+    tau0 = 2*top*np.random.default_rng(seed).random(lanes)
+    x = iterateMap(f, tau0, p, transient)
+    ranges = {"tau": tauRange, "gammaTau": gammaTauRange}
+    if None in ranges.values():
+        pilotStates = np.empty((pilot, lanes))
+        xPilot = x
+        for i in range(pilot):
+            xPilot = f(xPilot, p)
+            pilotStates[i] = xPilot
+        for name, values in (("tau", pilotStates), ("gammaTau", gammaTau(f, pilotStates, p))):
+            if ranges[name] is None:
+                low, high = np.nanmin(values), np.nanmax(values)
+                margin = 0.05*max(high - low, 1e-12)
+                ranges[name] = (max(low - margin, 0) if scale == "linear" else low/(1 + 0.05), high + margin)
+    state = {"kind": np.array(f.__name__), "record": p, "scale": np.array(scale), "x": x, "samples": np.array(0)}
+    for name in observables:
+        state[name + "Edges"] = binEdges(ranges[name], bins, scale)
+        state[name + "Counts"] = np.zeros(bins, dtype = np.int64)
+        state[name + "Outside"] = np.zeros(2, dtype = np.int64) ##Below the first edge, above the last edge or not finite
+        state[name + "Moments"] = np.array([0, 0, 0, np.inf, -np.inf]) ##Count, mean, sum of squared deviations, min, max
+    return state
+
+def combineMoments(a, b):
+    '''
+    Moments [count, mean, M2, min, max] of two disjoint sets of samples combined (Chan et al.)
+    '''
+    n = a[0] + b[0]
+    if n == 0:
+        return a.copy()
+    delta = b[1] - a[1]
+    return np.array([n, a[1] + delta*b[0]/n, a[2] + b[2] + delta**2*a[0]*b[0]/n, min(a[3], b[3]), max(a[4], b[4])])
+
+def binBlock(state, name, values):
+    '''
+    Adds a block of samples of one observable to its histogram and moments
+    '''
+    edges = state[name + "Edges"]
+    bins = len(edges) - 1
+    values = values.ravel()
+    finite = values[np.isfinite(values)]
+    row = binIndex(finite, edges, str(state["scale"]))
+    inside = (row >= 0) & (row < bins)
+    state[name + "Counts"] += np.bincount(row[inside].astype(np.int64), minlength = bins)
+    below = int(np.count_nonzero(row < 0))
+    state[name + "Outside"] += [below, values.size - below - int(np.count_nonzero(inside))]
+    if finite.size:
+        mean = finite.mean()
+        block = np.array([finite.size, mean, np.sum((finite - mean)**2), finite.min(), finite.max()])
+        state[name + "Moments"] = combineMoments(state[name + "Moments"], block)
+
+def advance(state, steps, blockSize = 256):
+    '''
+    Iterates every lane of the accumulator steps more times, binning blockSize steps of all lanes at a time
+    '''
+    f = getMap(str(state["kind"]))
+    x, p = ensemble(state["x"], state["record"])
+    buffer = np.empty((min(blockSize, steps), x.size))
+    for start in range(0, steps, blockSize):
+        block = buffer[:min(blockSize, steps - start)]
+        for i in range(len(block)):
+            x = f(x, p)
+            block[i] = x
+        binBlock(state, "tau", block)
+        binBlock(state, "gammaTau", gammaTau(f, block, state["record"]))
+        state["samples"] = np.array(int(state["samples"]) + block.size)
+    state["x"] = x
+    return state
+
+def saveAccumulator(filename, state):
+    '''
+    Writes an accumulator atomically as a .npz checkpoint
+    '''
+    temp = "{0}.{1}.tmp.npz".format(filename, os.getpid())
+    np.savez(temp, **state)
+    os.replace(temp, filename)
+
+def loadAccumulator(filename):
+    '''
+    Reads an accumulator saved by saveAccumulator
+    '''
+    with np.load(filename) as data:
+        return {key: data[key] for key in data.files}
+
+def mergeAccumulators(states):
+    '''
+    Combines accumulators of the same map, parameters and bins (e.g. from parallel workers) into one
+    The lane states of all of them are kept, so the merged accumulator can be advanced further
+    '''
+    merged = {key: value.copy() for key, value in states[0].items()}
+    for state in states[1:]:
+        if str(state["kind"]) != str(merged["kind"]) or not np.array_equal(state["record"], merged["record"]):
+            raise ValueError("Cannot merge invariant densities of different maps or parameters")
+        for name in observables:
+            if str(state["scale"]) != str(merged["scale"]) or not np.array_equal(state[name + "Edges"], merged[name + "Edges"]):
+                raise ValueError("Cannot merge {0} histograms with different bins".format(name))
+            merged[name + "Counts"] += state[name + "Counts"]
+            merged[name + "Outside"] += state[name + "Outside"]
+            merged[name + "Moments"] = combineMoments(merged[name + "Moments"], state[name + "Moments"])
+        merged["x"] = np.concatenate([merged["x"], state["x"]])
+        merged["samples"] = np.array(int(merged["samples"]) + int(state["samples"]))
+    return merged
+
+def density(state, name = "tau"):
+    '''
+    Bin edges, probability density (integrating to the fraction inside the range) and fraction of samples outside
+    '''
+    edges, counts = state[name + "Edges"], state[name + "Counts"]
+    total = max(int(state["samples"]), 1)
+    return edges, counts/(total*np.diff(edges)), state[name + "Outside"].sum()/total
+
+def moments(state, name = "tau"):
+    '''
+    Mean, variance, minimum and maximum of every sample of an observable
+    '''
+    n, mean, m2, low, high = state[name + "Moments"]
+    return mean, m2/n if n else np.nan, low, high
+
+def accumulateDensity(kind, p, nSamples, lanes = 1024, blockSize = 256, transient = 1000, tauRange = None, gammaTauRange = None, bins = 1000,
+                      scale = "linear", seed = None, checkpoint = None, checkpointEvery = 10**8):
+    '''
+    Streams at least nSamples states (rounded up to whole steps of every lane) into an accumulator and returns it
+    With a checkpoint filename the accumulator is saved every checkpointEvery samples and at the end, and a call
+    with an existing checkpoint carries on from it, so a run can be interrupted and extended at will
+    '''
+    if checkpoint is not None and os.path.exists(checkpoint):
+        state = loadAccumulator(checkpoint)
+        if str(state["kind"]) != getMap(kind).__name__ or not np.array_equal(state["record"], np.asarray(p, dtype = float).ravel()):
+            raise ValueError("Checkpoint {0} was written for a different map or parameters".format(checkpoint))
+    else:
+        state = newAccumulator(kind, p, lanes, tauRange, gammaTauRange, bins, scale, seed, transient)
+    lanes = state["x"].size
+    stepsEvery = max(checkpointEvery//lanes, blockSize)
+    while int(state["samples"]) < nSamples:
+        steps = min(-(-(nSamples - int(state["samples"]))//lanes), stepsEvery)
+        advance(state, steps, blockSize)
+        if checkpoint is not None:
+            saveAccumulator(checkpoint, state)
+    return state
+
+def densityWorker(task):
+    '''
+    Runs one shard of parallelDensity
+    '''
+    kind, p, nSamples, lanes, blockSize, transient, tauRange, gammaTauRange, bins, scale, seed, checkpoint, checkpointEvery = task
+    return accumulateDensity(kind, p, nSamples, lanes, blockSize, transient, tauRange, gammaTauRange, bins, scale, seed, checkpoint, checkpointEvery)
+
+def parallelDensity(kind, p, nSamples, workers = None, shards = 8, lanes = 1024, blockSize = 256, transient = 1000, tauRange = None,
+                    gammaTauRange = None, bins = 1000, scale = "linear", seed = None, checkpoint = None, checkpointEvery = 10**8):
+    '''
+    accumulateDensity split into a fixed number of shards, each with its own lanes and initial conditions spawned
+    from seed, run on workers processes and merged in shard order. The shards do not depend on workers, so a seed
+    gives the same histograms on any machine. Ranges left as None are fixed first by a pilot run so every shard
+    uses the same bins
+    With a checkpoint filename each shard keeps its own checkpoint.<shard>, so an interrupted run resumes
+    workers = 1 runs in process, None uses every core
+    '''
+    kind = getMap(kind).__name__ ##Functions defined in mapKernels pickle by name
+    workers = min(workers or os.cpu_count(), shards)
+    if tauRange is None or gammaTauRange is None:
+        pilot = newAccumulator(kind, p, lanes, tauRange, gammaTauRange, 1, scale, seed, transient)
+        tauRange, gammaTauRange = [(state[0], state[-1]) for state in (pilot["tauEdges"], pilot["gammaTauEdges"])]
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    share = -(-nSamples//shards)
+    tasks = [(kind, p, share, lanes, blockSize, transient, tauRange, gammaTauRange, bins, scale, seeds[i],
+              None if checkpoint is None else "{0}.{1}".format(checkpoint, i), checkpointEvery) for i in range(shards)]
+    if workers == 1:
+        return mergeAccumulators([densityWorker(task) for task in tasks])
+    with multiprocessing.Pool(workers) as pool:
+        return mergeAccumulators(pool.map(densityWorker, tasks, chunksize = 1))
+
+@cached(ignore = ("workers", "checkpoint", "checkpointEvery"))
+def densityHistogram(kind, p, nSamples, name = "tau", workers = None, shards = 8, lanes = 1024, blockSize = 256, transient = 1000,
+                     tauRange = None, gammaTauRange = None, bins = 1000, scale = "linear", seed = None, checkpoint = None,
+                     checkpointEvery = 10**8):
+    '''
+    density(parallelDensity(...), name) cached on disk, so a figure is redrawn without streaming the states again
+    '''
+    state = parallelDensity(kind, p, nSamples, workers, shards, lanes, blockSize, transient, tauRange, gammaTauRange, bins, scale, seed,
+                            checkpoint, checkpointEvery)
+    return density(state, name)
@@ -0,0 +1,171 @@
+import math
+import numpy as np
+import mapKernels
+from resultCache import cached
+
+##Optional compiled backend for the maps and the Lyapunov loop
+##With numba installed the per trajectory recurrences run as native loops, parallel over lanes.
+##Without it every function here falls back to the NumPy kernels in mapKernels, so callers never need to check.
+##Map values agree with mapKernels to a relative 1e-12. Exponents of regular orbits agree to 1e-8; for chaotic
+##orbits the last-bit differences grow along the trajectory, so the exponents agree statistically (well within 0.05)
+
+try:
+    import numba
+    haveNumba = True
+except ImportError:
+    haveNumba = False
+
+mapTolerance = 1e-12 ##Relative agreement of single map evaluations with mapKernels
+lyapunovTolerance = 1e-8 ##Absolute agreement of exponents on regular (non chaotic) orbits
+
+kindCodes = {mapKernels.constantGamma: 0, mapKernels.pierrehumbert: 1, mapKernels.guillot: 2}
+
+def kindCode(kind):
+    '''
+    Integer code of a map for the compiled loops: 0 for Map A, 1 for Map B, 2 for Map C
+    '''
+    return kindCodes[mapKernels.getMap(kind)]
+
+if haveNumba:
+    @numba.njit(cache = True)
+    def mapStep(code, tau, p):
+        '''
+        One step of map code from tau, returning the new tau and the analytic derivative
+        p is one record, [d,p2,gamma] for Map A and [d,p2,p3,p4] otherwise
+        '''
+        d = p[0]
+        p2 = p[1]
+        if code == 0:
+            gamma = p[2]
+            dGamma = 0.0
+        elif tau > 0:
+            t = math.tanh(math.log10(tau)/p[3])
+            gamma = 10.0**(p[2]*t)
+            dGamma = gamma*p[2]*(1 - t*t)/(p[3]*tau)
+        else:
+            gamma = 10.0**(-p[2])
+            dGamma = 0.0
+        invGamma = 1/gamma
+        expTerm = math.exp(-gamma*tau)
+        if code == 2:
+            coeff = gamma - invGamma
+            dCoeff = dGamma + invGamma*invGamma*dGamma
+        else:
+            coeff = 1 - invGamma
+            dCoeff = invGamma*invGamma*dGamma
+        s = 1 + invGamma + coeff*expTerm
+        root = s**0.25
+        newTau = d*math.exp(-p2/root)
+        dS = -invGamma*invGamma*dGamma + dCoeff*expTerm - coeff*expTerm*(dGamma*tau + gamma)
+        return newTau, newTau*0.25*p2*dS/(s*root)
+
+    @numba.njit(parallel = True, cache = True)
+    def mapLanes(code, tau, p):
+        '''
+        Map values for every lane
+        '''
+        out = np.empty(tau.size)
+        for i in numba.prange(tau.size):
+            out[i] = mapStep(code, tau[i], p[i])[0]
+        return out
+
+    @numba.njit(parallel = True, cache = True)
+    def orbitLanes(code, tau, p, n):
+        '''
+        Full n step orbit of every lane
+        '''
+        out = np.empty((tau.size, n + 1))
+        for i in numba.prange(tau.size):
+            x = tau[i]
+            out[i, 0] = x
+            for j in range(n):
+                x = mapStep(code, x, p[i])[0]
+                out[i, j+1] = x
+        return out
+
+    @numba.njit(parallel = True, cache = True)
+    def lyapunovLanes(code, tau, p, transient, n):
+        '''
+        Lyapunov exponent of every lane from the fused map and derivative step
+        '''
+        out = np.empty(tau.size)
+        for i in numba.prange(tau.size):
+            x = tau[i]
+            for j in range(transient):
+                x = mapStep(code, x, p[i])[0]
+            total = 0.0
+            for j in range(n):
+                x, slope = mapStep(code, x, p[i])
+                total += math.log(abs(slope))
+            out[i] = total/n
+        return out
+
+    @cached()
+    def compiledOrbit(code, tau, p, n):
+        '''
+        orbitLanes through the result cache, keyed separately from the NumPy results they may differ from in the last bits
+        '''
+        return orbitLanes(code, tau, p, n)
+
+    @cached()
+    def compiledLyapunov(code, tau, p, transient, n):
+        '''
+        lyapunovLanes through the result cache
+        '''
+        return lyapunovLanes(code, tau, p, transient, n)
+
+def lanes(tau, p):
+    '''
+    Broadcasts states against records the way the mapKernels functions do
+    Returns the output shape with flat, contiguous state and record arrays
+    '''
+    p = np.asarray(p, dtype = float)
+    shape = np.broadcast_shapes(np.shape(tau), p.shape[:-1])
+    tau = np.ascontiguousarray(np.broadcast_to(np.asarray(tau, dtype = float), shape).ravel())
+    p = np.ascontiguousarray(np.broadcast_to(p, shape + p.shape[-1:]).reshape(-1, p.shape[-1]))
+    return shape, tau, p
+
+def applyMap(kind, tau, p):
+    '''
+    Evaluates a map elementwise with the compiled kernel, or mapKernels without numba
+    '''
+    if not haveNumba:
+        return mapKernels.getMap(kind)(tau, p)
+    shape, tau, p = lanes(tau, p)
+    out = mapLanes(kindCode(kind), tau, p).reshape(shape)
+    return out if shape else out[()]
+
+def constantGamma(tau, p):
+    return applyMap(mapKernels.constantGamma, tau, p)
+
+def pierrehumbert(tau, p):
+    return applyMap(mapKernels.pierrehumbert, tau, p)
+
+def guillot(tau, p):
+    return applyMap(mapKernels.guillot, tau, p)
+
+def orbit(f, tau0, p, n):
+    '''
+    Compiled equivalent of mapKernels.orbit, returning the (lanes, n+1) array of visited states
+    '''
+    if not haveNumba:
+        return mapKernels.orbit(f, tau0, p, n)
+    tau, p = mapKernels.ensemble(tau0, p)
+    return compiledOrbit(kindCode(f), tau, np.ascontiguousarray(p), n)
+
+def lyapunovBatch(kind, params, x0 = 0, transient = 300, n = 10000):
+    '''
+    Compiled equivalent of mapKernels.lyapunovBatch, one native loop per lane spread over all cores
+    '''
+    if not haveNumba:
+        return mapKernels.lyapunovBatch(kind, params, x0, transient, n)
+    tau, p = mapKernels.ensemble(x0, params)
+    return compiledLyapunov(kindCode(kind), tau, np.ascontiguousarray(p), transient, n)
+
+def lyapunovExp(f, x0, args, transient = 300, n = 10000):
+    '''
+    Compiled equivalent of mapKernels.lyapunovExp for a single trajectory
+    '''
+    if not haveNumba:
+        return mapKernels.lyapunovExp(f, x0, args, transient, n)
+    return lyapunovBatch(f, [args], x0, transient, n)[0]
@@ -0,0 +1,168 @@
+import numpy as np
+import argparse
+import json
+import multiprocessing
+import os
+from matplotlib.colors import TwoSlopeNorm
+from mapKernels import constantGamma, getMap
+from orbitDiagram import diagramRecords
+from chaosSweep import estimate
+from resultCache import uncached
+
+##Two dimensional slices of the Lyapunov exponent through the parameter space
+##lambda is evaluated on a grid over any two of p1, p2, p3, p4 (gamma for Map A) with the others fixed. The grid is
+##cut into square tiles, each one batch of the vectorized estimator handed to a pool of workers, and every finished
+##tile is saved as its own .npy next to a settings file, so a large slice (2048x2048 overnight) can be interrupted
+##and resumed and the image redrawn at any point from the tiles done so far
+##    python lyapunovSlice.py B --x p1 0 1 2048 --y p3 0 2 2048 --fixed p2=38 --output slices/p1p3
+
+def sliceRecords(kind, xParam, xValues, yParam, yValues, fixedParams):
+    '''
+    Parameter records of every point of the (len(yValues), len(xValues)) grid, x varying fastest
+    Every parameter of the map besides the two axes must be in fixedParams, except p4 which defaults to 0.5
+    '''
+    f = getMap(kind)
+    if f is constantGamma: ##gamma is stored in the p3 slot, so p3 and gamma name the same parameter
+        slots, required = {"p1": "p1", "p2": "p2", "p3": "p3", "gamma": "p3"}, ("p1", "p2", "gamma")
+    else:
+        slots, required = {"p1": "p1", "p2": "p2", "p3": "p3", "p4": "p4"}, ("p1", "p2", "p3")
+    for name in [xParam, yParam] + list(fixedParams):
+        if name not in slots:
+            raise ValueError("{0} is not a parameter of {1}".format(name, f.__name__))
+    if slots[xParam] == slots[yParam]:
+        raise ValueError("The two axes of a slice must be different parameters")
+    fixed = {slots[name]: value for name, value in fixedParams.items()}
+    missing = [name for name in required if slots[name] not in fixed and slots[name] not in (slots[xParam], slots[yParam])]
+    if missing:
+        raise ValueError("No fixed value given for {0}".format(", ".join(missing)))
+    x, y = np.meshgrid(xValues, yValues)
+    fixed[slots[yParam]] = y.ravel()
+    return diagramRecords(f, xParam, x.ravel(), fixed)[0]
+
+def runTile(task):
+    '''
+    Lyapunov exponents of one tile, returned as (row, column, (rows, columns) array)
+    '''
+    row, column, kind, xParam, xValues, yParam, yValues, fixedParams, x0, transient, n, adaptive, dtype, cycles = task
+    records = sliceRecords(kind, xParam, xValues, yParam, yValues, fixedParams)
+    with uncached(): ##Tiles are saved by computeSlice itself
+        lyExp = estimate(kind, records, x0, transient, n, adaptive, dtype, cycles)
+    return row, column, lyExp.reshape(len(yValues), len(xValues))
+
+def axisValues(settings, axis):
+    '''
+    Grid values along "x" or "y" of a slice's settings
+    '''
+    low, high, count = settings[axis + "Range"]
+    return np.linspace(low, high, count)
+
+def tileFile(directory, row, column):
+    return os.path.join(directory, "tile_{0}_{1}.npy".format(row, column))
+
+def computeSlice(kind, xParam, xRange, yParam, yRange, fixedParams, directory, tileSize = 128, workers = None, x0 = 0, transient = 300, n = 1000,
+                 adaptive = False, dtype = "float64", cycles = False):
+    '''
+    Evaluates lambda on the grid of xRange = (min, max, count) by yRange over xParam and yParam and saves it in directory
+    Tiles already saved by an earlier call with the same settings are skipped, so an interrupted run resumes
+    adaptive, dtype and cycles select the estimator as in chaosSweep. workers = 1 runs in process, None uses every core
+    Returns the slice as from loadSlice
+    '''
+    kind = getMap(kind).__name__ ##Functions defined in mapKernels pickle by name
+    settings = {"kind": kind, "xParam": xParam, "xRange": list(xRange), "yParam": yParam, "yRange": list(yRange),
+                "fixedParams": {key: float(value) for key, value in fixedParams.items()}, "tileSize": tileSize, "x0": x0,
+                "transient": transient, "n": n, "adaptive": adaptive, "dtype": dtype, "cycles": cycles}
+    settingsFile = os.path.join(directory, "settings.json")
+    os.makedirs(directory, exist_ok = True)
+    if os.path.exists(settingsFile):
+        with open(settingsFile) as file:
+            saved = json.load(file)
+            saved.setdefault("cycles", False) ##Slices from before the cycle estimator was selectable
+            if saved != json.loads(json.dumps(settings)):
+                raise ValueError("Slice {0} was computed with different settings".format(directory))
+    else:
+        with open(settingsFile, "w") as file:
+            json.dump(settings, file, indent = 1)
+    xValues, yValues = axisValues(settings, "x"), axisValues(settings, "y")
+    tasks = [(row, column, kind, xParam, xValues[column*tileSize:(column+1)*tileSize], yParam, yValues[row*tileSize:(row+1)*tileSize],
+              settings["fixedParams"], x0, transient, n, adaptive, dtype, cycles)
+             for row in range(-(-len(yValues)//tileSize)) for column in range(-(-len(xValues)//tileSize))
+             if not os.path.exists(tileFile(directory, row, column))]
+    if workers == 1:
+        results = map(runTile, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(runTile, tasks, chunksize = 1) ##Tiles are saved as they finish, in any order
+    try:
+        for row, column, lyExp in results:
+            temp = tileFile(directory, row, column) + ".tmp"
+            with open(temp, "wb") as file:
+                np.save(file, lyExp)
+            os.replace(temp, tileFile(directory, row, column))
+    finally:
+        if workers != 1:
+            pool.terminate()
+    return loadSlice(directory)
+
+def loadSlice(directory):
+    '''
+    The x values, y values and (len(y), len(x)) lambda grid of a saved slice, NaN where a tile is not done yet,
+    and its settings
+    '''
+    with open(os.path.join(directory, "settings.json")) as file:
+        settings = json.load(file)
+    xValues, yValues = axisValues(settings, "x"), axisValues(settings, "y")
+    tileSize = settings["tileSize"]
+    lyExp = np.full((len(yValues), len(xValues)), np.nan)
+    for row in range(-(-len(yValues)//tileSize)):
+        for column in range(-(-len(xValues)//tileSize)):
+            if os.path.exists(tileFile(directory, row, column)):
+                lyExp[row*tileSize:(row+1)*tileSize, column*tileSize:(column+1)*tileSize] = np.load(tileFile(directory, row, column))
+    return xValues, yValues, lyExp, settings
+
+def drawSlice(ax, xValues, yValues, lyExp, cmap = "RdBu_r", limits = None):
+    '''
+    Draws a lambda grid with one imshow on a diverging colour map centred on zero, chaotic points red and regular blue
+    limits are the lambda at the two ends of the colour map, by default the 99th percentiles of the finite negative
+    and positive exponents, so the weakly chaotic regions are not washed out by strongly contracting ones
+    '''
+    if limits is None:
+        finite = lyExp[np.isfinite(lyExp)] ##lambda = -inf where the map is flat, e.g. p1 = 0
+        negative, positive = -finite[finite < 0], finite[finite > 0]
+        limits = (-np.percentile(negative, 99) if negative.size else -1, np.percentile(positive, 99) if positive.size else 1)
+    step = [(values[-1] - values[0])/max(len(values) - 1, 1) for values in (xValues, yValues)]
+    extent = [xValues[0] - step[0]/2, xValues[-1] + step[0]/2, yValues[0] - step[1]/2, yValues[-1] + step[1]/2]
+    return ax.imshow(lyExp, origin = "lower", extent = extent, aspect = "auto", cmap = cmap, interpolation = "nearest",
+                     norm = TwoSlopeNorm(0, limits[0], limits[1]))
+
+axisLabels = {"p1": "$p_1$", "p2": "$p_2$", "p3": "$p_3$", "p4": "$p_4$", "gamma": "$\\gamma$"}
+
+if __name__ == "__main__": ##Guard needed for the worker processes
+    import matplotlib.pyplot as plt
+    parser = argparse.ArgumentParser(description = "Lyapunov exponent over a 2D slice of parameter space, computed in resumable tiles")
+    parser.add_argument("kind", help = "A, B, C or a map name")
+    parser.add_argument("--x", nargs = 4, metavar = ("PARAM", "MIN", "MAX", "N"), required = True)
+    parser.add_argument("--y", nargs = 4, metavar = ("PARAM", "MIN", "MAX", "N"), required = True)
+    parser.add_argument("--fixed", nargs = "*", default = [], metavar = "PARAM=VALUE", help = "the other parameters, e.g. p2=38 p4=0.5")
+    parser.add_argument("--output", required = True, help = "directory for the tiles, the settings and slice.png")
+    parser.add_argument("--tile", type = int, default = 128)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--transient", type = int, default = 300)
+    parser.add_argument("--n", type = int, default = 1000)
+    parser.add_argument("--adaptive", action = "store_true")
+    parser.add_argument("--cycles", action = "store_true", help = "stop points that settle on a short cycle")
+    parser.add_argument("--dtype", default = "float64")
+    args = parser.parse_args()
+    fixed = {key: float(value) for key, value in (item.split("=") for item in args.fixed)}
+    xRange = (float(args.x[1]), float(args.x[2]), int(args.x[3]))
+    yRange = (float(args.y[1]), float(args.y[2]), int(args.y[3]))
+    xValues, yValues, lyExp, settings = computeSlice(args.kind, args.x[0], xRange, args.y[0], yRange, fixed, args.output, args.tile, args.workers,
+                                                     transient = args.transient, n = args.n, adaptive = args.adaptive, dtype = args.dtype,
+                                                     cycles = args.cycles)
+    fig, ax = plt.subplots(1, 1, figsize = (10, 8))
+    image = drawSlice(ax, xValues, yValues, lyExp)
+    fig.colorbar(image, ax = ax, label = "$\\lambda$")
+    ax.set_xlabel(axisLabels.get(args.x[0], args.x[0]), fontsize = 24)
+    ax.set_ylabel(axisLabels.get(args.y[0], args.y[0]), fontsize = 24)
+    ax.set_title(", ".join("{0} = {1:g}".format(axisLabels.get(key, key), value) for key, value in fixed.items()), fontsize = 20)
+    plt.tight_layout()
+    plt.savefig(os.path.join(args.output, "slice.png"), dpi = 150)
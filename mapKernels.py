@@ -0,0 +1,467 @@
+import numpy as np
+import math
+from resultCache import cached
+
+try:
+    import numexpr
+    haveNumexpr = True
+except ImportError:
+    haveNumexpr = False
+
+##Shared map kernels for Maps A, B and C
+##Every kernel broadcasts: p may be a single record [d,p2,p3,p4] or an (n,4) array of records,
+##and tau may be a scalar or any array whose trailing axis lines up with the records
+##The kernels leave floating point warnings alone, since an errstate context costs as much as a scalar step;
+##the batch functions below silence the expected ones (log10(0) for lanes starting at tau = 0) once per call
+
+defaultChunkSize = 4096 ##Lanes advanced together, small enough to keep a chunk cache resident
+
+def columns(p):
+    '''
+    Splits parameter records into their columns
+    p is either one record [d,p2,...] or an (n,k) array of records
+    float32 records stay float32 so the single precision mode runs every kernel in float32
+    A single record given as a list or tuple of numbers is returned as it is, keeping scalar calls as cheap as the
+    original p[0], p[1]... indexing
+    '''
+    if type(p) in (list, tuple) and not hasattr(p[0], "__len__"):
+        return p
+    p = np.asarray(p)
+    if p.dtype != np.float32:
+        p = p.astype(float)
+    return [p[..., i] for i in range(p.shape[-1])]
+
+def radiativeMap(tau, gamma, p):
+    '''
+    Map with a constant visible-to-IR opacity ratio gamma (Map A)
+    p is an array of 2 values [d,p2]
+    '''
+    d, p2 = columns(p)[:2]
+    newTau = d*np.exp(-p2/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+def constantGamma(tau, p):
+    '''
+    Map A with gamma carried as the third parameter
+    p is an array of 3 values [d,p2,gamma]
+    '''
+    d, p2, gamma = columns(p)[:3]
+    newTau = d*np.exp(-p2/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+def pierrehumbert(tau, p):
+    '''
+    Map using the two stream solution derived in Pierrehumbert (20xx)
+    $$\gamma = 10^{p3\tanh(\log(\frac{\tau}{p4}))}$$
+    $$\tau_{i+1} = p1e^{\frac{-p2}{(1 + \frac{1}{\gamma} + (1-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}
+    p is an array of 4 values [d,p2,p3,4]
+    '''
+    d, p2, p3, p4 = columns(p)
+    gamma = 10**(p3*np.tanh(np.log10(tau)/p4)) ##log10(0) = -inf gives gamma = 10^-p3 as intended
+    newTau = d*np.exp(-p2/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+def guillot(tau, p):
+    '''
+    Map using the two stream solution derived in Guillot (20xx)
+    $$\gamma = 10^{p_3\tanh(\log(\frac{\tau}{p_4}))}$$
+    $$\tau_{i+1} = p_1e^{\frac{-p_2}{(1 + \frac{1}{\gamma} + (\gamma-\frac{1}{gamma})e^{-\gamma\tau})^{-\frac{1}{4}}}}$$
+    p is an array of 4 values [d,p2,p3,4]
+    '''
+    d, p2, p3, p4 = columns(p)
+    gamma = 10**(p3*np.tanh(np.log10(tau)/p4))
+    newTau = d*np.exp(-p2/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+maps = {"A": constantGamma, "constantGamma": constantGamma,
+        "B": pierrehumbert, "pierrehumbert": pierrehumbert,
+        "C": guillot, "guillot": guillot}
+
+def getMap(kind):
+    '''
+    Returns the map function for a kind given as "A", "B", "C", a function name or the function itself
+    '''
+    if callable(kind):
+        return kind
+    if kind not in maps:
+        raise ValueError("Unknown map kind {0}, expected one of {1}".format(kind, sorted(maps)))
+    return maps[kind]
+
+ln10 = np.log(10)
+fusedBlockSize = 16384 ##Elements per block of fusedMap, sized so the block and its two work buffers stay in L2
+
+def fusedBlock(f, tau, d, p2, p3, p4, out, gamma, invGamma):
+    '''
+    One block of fusedMap, every step written in place into out and the two work buffers
+    gamma = 10^{p3 tanh(log10(tau)/p4)} is evaluated as exp(p3 ln10 tanh(ln(tau)/(p4 ln10))) and 1/gamma is computed once
+    '''
+    if f is constantGamma:
+        gamma[...] = p3
+    else:
+        with np.errstate(divide = "ignore"): ##ln(0) = -inf gives gamma = 10^-p3 as in the plain kernels
+            np.log(tau, out = gamma)
+        np.divide(gamma, p4*ln10, out = gamma)
+        np.tanh(gamma, out = gamma)
+        np.multiply(gamma, p3*ln10, out = gamma)
+        np.exp(gamma, out = gamma)
+    np.reciprocal(gamma, out = invGamma)
+    np.multiply(gamma, tau, out = out)
+    np.negative(out, out = out)
+    np.exp(out, out = out)
+    if f is guillot:
+        np.subtract(gamma, invGamma, out = gamma)
+    else:
+        np.subtract(1, invGamma, out = gamma)
+    np.multiply(out, gamma, out = out)
+    out += invGamma
+    out += 1
+    np.sqrt(out, out = out) ##Two square roots are cheaper than **(1/4)
+    np.sqrt(out, out = out)
+    np.divide(p2, out, out = out)
+    np.negative(out, out = out)
+    np.exp(out, out = out)
+    np.multiply(out, d, out = out)
+    return out
+
+def fusedMap(kind, tau, p, out = None, blockSize = fusedBlockSize, useNumexpr = haveNumexpr):
+    '''
+    Evaluates a map like the plain kernels but without a temporary per operation, for large arrays
+    With useNumexpr (the default when numexpr is installed) the expression is compiled and run multithreaded in two
+    passes (gamma, then the update); otherwise it runs block by block through preallocated buffers so the
+    intermediates never leave the cache. validation.fusedAgreement checks both against the plain kernels
+    out may be given to reuse an output array of the broadcast shape between calls, and is written in place
+    Agrees with the plain kernels to a few parts in 1e13
+    '''
+    f = getMap(kind)
+    tau = np.asarray(tau, dtype = float)
+    cols = columns(p)
+    if f is constantGamma:
+        cols = list(cols[:3]) + [1.0]
+    shape = np.broadcast_shapes(tau.shape, *[np.shape(c) for c in cols])
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape or out.dtype != float:
+        raise ValueError("out must be a float64 array of shape {0}".format(shape))
+    if useNumexpr:
+        if not haveNumexpr:
+            raise ImportError("useNumexpr needs the numexpr package")
+        d, p2, p3, p4 = cols
+        if f is constantGamma:
+            gamma = np.broadcast_to(p3, shape)
+        else:
+            with np.errstate(divide = "ignore"):
+                gamma = numexpr.evaluate("exp(p3*ln10*tanh(log(tau)/(p4*ln10)))", local_dict = {"p3": p3, "p4": p4, "tau": tau, "ln10": ln10})
+        coeff = "g - 1/g" if f is guillot else "1 - 1/g"
+        numexpr.evaluate("d*exp(-p2/sqrt(sqrt(1 + 1/g + ({0})*exp(-g*tau))))".format(coeff),
+                         local_dict = {"d": d, "p2": p2, "g": gamma, "tau": tau}, out = out)
+        return out if shape else out[()]
+    ##Blocks are runs of rows along the first axis. Operands spanning that axis are sliced as views, the rest
+    ##broadcast inside each block, so no record column is copied to the output shape
+    rows = out if shape else out.reshape(1)
+    nRows = rows.shape[0]
+    rowsPerBlock = max(1, blockSize//max(int(np.prod(rows.shape[1:])), 1))
+    work = np.empty((2, min(rowsPerBlock, nRows)) + rows.shape[1:])
+    operands = [tau] + cols
+    sliced = [len(shape) > 0 and np.ndim(x) == len(shape) and np.shape(x)[0] == nRows for x in operands]
+    for start in range(0, nRows, rowsPerBlock):
+        stop = min(start + rowsPerBlock, nRows)
+        block = [x[start:stop] if cut else x for x, cut in zip(operands, sliced)]
+        fusedBlock(f, *block, rows[start:stop], work[0, :stop-start], work[1, :stop-start])
+    return out if shape else out[()]
+
+def parameterRecords(kind, p1, p2, p3, p4 = 0.5):
+    '''
+    Builds an (n,4) array of records [d,p2,p3,p4] from the physical parameters
+    d is normalised the same way as in the figures, so p1 is the fixed point scale
+    For Map A p3 is gamma and the records are [d,p2,gamma]
+    '''
+    f = getMap(kind)
+    p1, p2, p3, p4 = np.broadcast_arrays(*[np.asarray(x, dtype = float) for x in (p1, p2, p3, p4)])
+    if f is guillot:
+        d = p1*np.exp(p2*(1 + 10**(-p3))**(-0.25))
+    else:
+        d = p1*np.exp(p2*(2)**(-0.25))
+    if f is constantGamma:
+        return np.stack([d, p2, p3], axis = -1).reshape(-1, 3)
+    return np.stack([d, p2, p3, p4], axis = -1).reshape(-1, 4)
+
+def ensemble(tau0, p, dtype = "float64"):
+    '''
+    Broadcasts initial states and parameter records to one lane per trajectory
+    Returns a writable (n,) state array and an (n,k) record array, both of dtype ("float32" for the single precision mode)
+    '''
+    p = np.atleast_2d(np.asarray(p, dtype = dtype))
+    tau0 = np.atleast_1d(np.asarray(tau0, dtype = dtype)).ravel()
+    n = max(tau0.size, p.shape[0])
+    return np.broadcast_to(tau0, (n,)).copy(), np.broadcast_to(p, (n, p.shape[1]))
+
+def iterateMap(f, tau0, p, n, chunkSize = defaultChunkSize, dtype = "float64"):
+    '''
+    Advances every lane of the ensemble n iterations and returns the final states
+    Lanes are processed chunkSize at a time so each chunk stays in cache for all n steps
+    '''
+    f = getMap(f)
+    tau, p = ensemble(tau0, p, dtype)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        for start in range(0, tau.size, chunkSize):
+            x = tau[start:start+chunkSize]
+            pc = p[start:start+chunkSize]
+            for i in range(n):
+                x = f(x, pc)
+            tau[start:start+chunkSize] = x
+    return tau
+
+@cached()
+def orbit(f, tau0, p, n, chunkSize = defaultChunkSize, dtype = "float64"):
+    '''
+    Iterates every lane n times and returns the (lanes, n+1) array of visited states
+    Column 0 holds the initial states
+    '''
+    f = getMap(f)
+    tau, p = ensemble(tau0, p, dtype)
+    out = np.empty((tau.size, n + 1), dtype = dtype)
+    out[:, 0] = tau
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        for start in range(0, tau.size, chunkSize):
+            pc = p[start:start+chunkSize]
+            block = out[start:start+chunkSize]
+            for i in range(n):
+                block[:, i+1] = f(block[:, i], pc)
+    return out
+
+def twoStreamDeriv(tau, d, p2, gamma, dGamma, guillotForm):
+    '''
+    Evaluates the two stream map and its derivative with respect to tau in one pass
+    dGamma is d(gamma)/d(tau), zero for constant gamma
+    guillotForm selects the (gamma - 1/gamma) coefficient of Map C over the (1 - 1/gamma) of Maps A and B
+    '''
+    invGamma = 1/gamma
+    expTerm = np.exp(-gamma*tau)
+    if guillotForm:
+        coeff = gamma - invGamma
+        dCoeff = dGamma + invGamma**2*dGamma
+    else:
+        coeff = 1 - invGamma
+        dCoeff = invGamma**2*dGamma
+    s = 1 + invGamma + coeff*expTerm
+    root = s**(1/4)
+    newTau = d*np.exp(-p2/root)
+    dS = -invGamma**2*dGamma + dCoeff*expTerm - coeff*expTerm*(dGamma*tau + gamma)
+    slope = newTau*0.25*p2*dS/(s*root) ##d/dtau of exp(-p2 s^{-1/4}) is exp(..) p2 s^{-5/4} ds/4
+    return newTau, slope
+
+def opacityLaw(tau, p3, p4):
+    '''
+    Returns gamma = 10^{p3 tanh(log10(tau)/p4)} and its derivative d(gamma)/d(tau)
+    $$\frac{d\gamma}{d\tau} = \gamma\frac{p_3}{p_4\tau}(1 - \tanh^2(\log_{10}(\tau)/p_4))$$
+    which tends to zero as tau -> 0 for the p4 < 2/ln(10) used throughout (tau = 0 divides by zero, so callers
+    iterating from it silence the warning)
+    '''
+    t = np.tanh(np.log10(tau)/p4)
+    gamma = 10**(p3*t)
+    dGamma = np.where(tau > 0, gamma*p3*(1 - t*t)/(p4*tau), 0.0)
+    return gamma, dGamma
+
+def constantGammaDeriv(tau, p):
+    '''
+    Map A and its analytic derivative, p is [d,p2,gamma]
+    '''
+    d, p2, gamma = columns(p)[:3]
+    return twoStreamDeriv(tau, d, p2, gamma, 0.0, False)
+
+def pierrehumbertDeriv(tau, p):
+    '''
+    Map B and its analytic derivative including the d(gamma)/d(tau) term of the opacity law
+    '''
+    d, p2, p3, p4 = columns(p)
+    gamma, dGamma = opacityLaw(tau, p3, p4)
+    return twoStreamDeriv(tau, d, p2, gamma, dGamma, False)
+
+def guillotDeriv(tau, p):
+    '''
+    Map C and its analytic derivative including the d(gamma)/d(tau) term of the opacity law
+    '''
+    d, p2, p3, p4 = columns(p)
+    gamma, dGamma = opacityLaw(tau, p3, p4)
+    return twoStreamDeriv(tau, d, p2, gamma, dGamma, True)
+
+derivatives = {constantGamma: constantGammaDeriv, pierrehumbert: pierrehumbertDeriv, guillot: guillotDeriv}
+
+def nDeriv(f, x, args):
+    '''
+    Numerical derivative over a delta of 0.00001 to the right
+    Only used for maps without an analytic derivative
+    '''
+    delta = f(x+0.00001, args) - f(x, args)
+    return delta/0.00001
+
+def mapAndDeriv(f):
+    '''
+    Returns a function giving (f(tau), f'(tau)) for the map f
+    '''
+    f = getMap(f)
+    if f in derivatives:
+        return derivatives[f]
+    return lambda tau, p: (f(tau, p), nDeriv(f, tau, p))
+
+def scalarStep(f, p):
+    '''
+    Pure float version of mapAndDeriv(f) for a single record, written with the math module
+    NumPy ufuncs cost about a microsecond each on Python floats, so this is several times cheaper per scalar step.
+    Raises (ValueError, OverflowError) where the NumPy kernels would return -inf, inf or nan
+    '''
+    d, p2, p3 = float(p[0]), float(p[1]), float(p[2])
+    p4 = 0.5 if f is constantGamma else float(p[3])
+    guillotForm = f is guillot
+    def step(tau):
+        if f is constantGamma:
+            gamma, dGamma = p3, 0.0
+        elif tau > 0:
+            t = math.tanh(math.log10(tau)/p4)
+            gamma = 10**(p3*t)
+            dGamma = gamma*p3*(1 - t*t)/(p4*tau)
+        else: ##tanh(log10(0)/p4) = -1
+            gamma, dGamma = 10**-p3, 0.0
+        invGamma = 1/gamma
+        expTerm = math.exp(-gamma*tau)
+        if guillotForm:
+            coeff = gamma - invGamma
+            dCoeff = dGamma + invGamma*invGamma*dGamma
+        else:
+            coeff = 1 - invGamma
+            dCoeff = invGamma*invGamma*dGamma
+        s = 1 + invGamma + coeff*expTerm
+        root = s**0.25
+        newTau = d*math.exp(-p2/root)
+        dS = -invGamma*invGamma*dGamma + dCoeff*expTerm - coeff*expTerm*(dGamma*tau + gamma)
+        return newTau, newTau*0.25*p2*dS/(s*root)
+    return step
+
+@cached()
+def lyapunovExp(f, x0, args, transient = 300, n = 10000):
+    '''
+    Calculates the lyapunov exponent using the method in Strogatz Ch 10
+    The map value and its analytic derivative come from the same pass, so each step costs one map evaluation
+    A scalar start and a single record run through scalarStep in plain floats, falling back to the NumPy kernels
+    if a step meets a zero slope or an overflow
+    '''
+    f = getMap(f)
+    if f in derivatives and np.ndim(x0) == 0 and np.ndim(args) == 1:
+        step = scalarStep(f, args)
+        try:
+            x = float(x0)
+            for i in range(transient):
+                x = step(x)[0]
+            lyExp = 0.0
+            for i in range(n):
+                x, slope = step(x)
+                lyExp += math.log(abs(slope))
+            return lyExp/n
+        except (ValueError, OverflowError, ZeroDivisionError):
+            pass
+    step = mapAndDeriv(f)
+    lyExp = 0
+    x = x0
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        for i in range(transient):
+            x = f(x,args)
+        for i in range(n):
+            x, slope = step(x,args)
+            lyExp += np.log(np.abs(slope))
+    lyExp /= n
+    return lyExp
+
+@cached()
+def lyapunovBatch(kind, params, x0 = 0, transient = 300, n = 10000, chunkSize = defaultChunkSize, dtype = "float64"):
+    '''
+    Lyapunov exponents of a whole batch of parameter records, advanced together
+    params is an (n,4) array of records, x0 a scalar or one initial state per record
+    Returns one exponent per record, matching lyapunovExp applied to each record in turn
+    dtype = "float32" iterates in single precision (see lyapunovMixedBatch), the sum of log|f'| is always float64
+    '''
+    f = getMap(kind)
+    step = mapAndDeriv(f)
+    tau, p = ensemble(x0, params, dtype)
+    lyExp = np.empty(tau.size)
+    with np.errstate(divide = "ignore", over = "ignore", invalid = "ignore"):
+        for start in range(0, tau.size, chunkSize):
+            x = tau[start:start+chunkSize]
+            pc = p[start:start+chunkSize]
+            total = np.zeros(x.size)
+            for i in range(transient):
+                x = f(x, pc)
+            for i in range(n):
+                x, slope = step(x, pc)
+                total += np.log(np.abs(slope))
+            lyExp[start:start+chunkSize] = total/n
+    return lyExp
+
+@cached()
+def lyapunovMixedBatch(kind, params, x0 = 0, transient = 300, n = 10000, recheckEvery = 16, band = 0.05, chunkSize = defaultChunkSize):
+    '''
+    lyapunovBatch in float32 with float64 guardrails, for sweeps that only need the sign and rough size of the exponent
+    Every recheckEvery-th lane, every lane within band of zero and every non finite lane is rerun in float64 and takes
+    the float64 exponent. The periodic sample shows how often float32 alone gets the regime (chaotic or not) wrong
+    Returns (exponents, lanes rechecked, rechecked lanes whose float32 regime disagreed with float64)
+    '''
+    tau, p = ensemble(x0, params)
+    lyExp = lyapunovBatch(kind, p, tau, transient, n, chunkSize, dtype = "float32")
+    recheck = (np.arange(tau.size) % recheckEvery == 0) | ~(np.abs(lyExp) >= band)
+    exact = lyapunovBatch(kind, p[recheck], tau[recheck], transient, n, chunkSize)
+    disagree = np.zeros(tau.size, dtype = bool)
+    disagree[recheck] = (lyExp[recheck] > 0) != (exact > 0)
+    lyExp[recheck] = exact
+    return lyExp, recheck, disagree
+
+@cached()
+def lyapunovAdaptiveBatch(kind, params, x0 = 0, transient = 300, tol = 0.005, batchSize = 50, minBatches = 4,
+                          maxIter = 10000, nearZeroIter = 40000, zSign = 2.0):
+    '''
+    Lyapunov exponents with early stopping, iterating each lane only until its estimate has settled
+    log|f'| is averaged over batches of batchSize steps and the standard error is taken from the spread of the batch means
+    A lane stops once its standard error is below tol and the exponent is more than zSign standard errors from zero.
+    Lanes whose estimate still straddles zero at maxIter carry on up to nearZeroIter, the rest stop at maxIter
+    Returns (exponents, standard errors, iterations used), one entry per record
+    '''
+    f = getMap(kind)
+    step = mapAndDeriv(f)
+    tau, p = ensemble(x0, params)
+    tau = iterateMap(f, tau, p, transient)
+    total = np.zeros(tau.size)
+    totalSq = np.zeros(tau.size)
+    batches = np.zeros(tau.size, dtype = int)
+    lyExp = np.zeros(tau.size)
+    error = np.full(tau.size, np.inf)
+    active = np.arange(tau.size)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        while active.size:
+            x = tau[active]
+            pa = p[active]
+            batchTotal = np.zeros(active.size)
+            for i in range(batchSize):
+                x, slope = step(x, pa)
+                batchTotal += np.log(np.abs(slope))
+            tau[active] = x
+            batchMean = batchTotal/batchSize
+            total[active] += batchMean
+            totalSq[active] += batchMean**2
+            batches[active] += 1
+            k = batches[active]
+            mean = total[active]/k
+            se = np.sqrt(np.maximum(totalSq[active] - total[active]**2/k, 0)/np.maximum(k - 1, 1)/k)
+            lyExp[active] = mean
+            error[active] = np.where(k > 1, se, np.inf)
+            iterations = k*batchSize
+            resolved = np.abs(mean) > zSign*se
+            done = (k >= minBatches) & (se < tol) & resolved
+            done |= (iterations >= maxIter) & (resolved | (iterations >= nearZeroIter))
+            done |= ~np.isfinite(mean) ##A superstable point has log|f'| = -inf, which is as regular as it gets
+            active = active[~done]
+    return lyExp, error, batches*batchSize
+
+def lyapunovAdaptive(f, x0, args, transient = 300, tol = 0.005, maxIter = 10000, nearZeroIter = 40000):
+    '''
+    Single trajectory version of lyapunovAdaptiveBatch, returning (exponent, standard error, iterations used)
+    '''
+    lyExp, error, iterations = lyapunovAdaptiveBatch(f, [args], x0, transient, tol = tol, maxIter = maxIter, nearZeroIter = nearZeroIter)
+    return lyExp[0], error[0], iterations[0]
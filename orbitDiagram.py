@@ -0,0 +1,182 @@
+import numpy as np
+from mapKernels import constantGamma, getMap, iterateMap, mapAndDeriv, parameterRecords
+from cycleDetection import findPeriod, tauFloor
+from resultCache import cached
+
+##Orbit (bifurcation) diagrams with every (parameter value, initial condition) pair iterated as one ensemble
+
+def diagramRecords(kind, axisParam, values, fixedParams):
+    '''
+    Parameter records for each value along axisParam, with the other parameters taken from fixedParams
+    axisParam is one of "p1", "p2", "p3", "p4", or "gamma" for Map A (stored in the p3 slot)
+    Returns the (n,k) records and the p1 of each record, which sets the initial condition scale
+    '''
+    f = getMap(kind)
+    params = {"p1": 0.0, "p2": 0.0, "p3": 0.0, "p4": 0.5}
+    params.update(fixedParams)
+    if "gamma" in params:
+        params["p3"] = params.pop("gamma")
+    if axisParam == "gamma":
+        if f is not constantGamma:
+            raise ValueError("gamma is only a free parameter of Map A")
+        axisParam = "p3"
+    if axisParam not in params:
+        raise ValueError("Unknown parameter axis {0}".format(axisParam))
+    params[axisParam] = np.asarray(values, dtype = float)
+    p1 = np.broadcast_to(params["p1"], np.shape(values))
+    return parameterRecords(f, params["p1"], params["p2"], params["p3"], params["p4"]), p1
+
+@cached()
+def orbitDiagram(kind, axisParam, values, fixedParams, nIc = 5, transient = 100, keep = 101, icScale = 2, dtype = "float64"):
+    '''
+    Iterates every (value, initial condition) pair together and returns the (len(values), nIc, keep) block of
+    states transient to transient+keep-1
+    Initial conditions are spread over [0, icScale*p1] as in the figures (nIc = 1 starts from tau = 0)
+    dtype = "float32" iterates in single precision, plenty for a plot and half the memory traffic
+    '''
+    f = getMap(kind)
+    records, p1 = diagramRecords(f, axisParam, values, fixedParams)
+    nParams = len(records)
+    tau0 = np.outer(icScale*p1, np.linspace(0, 1, nIc) if nIc > 1 else [0.0])
+    records = np.repeat(records, nIc, axis = 0)
+    records = records.astype(dtype)
+    taus = np.empty((nParams*nIc, keep), dtype = dtype)
+    x = iterateMap(f, tau0.ravel(), records, transient, dtype = dtype)
+    with np.errstate(divide = "ignore", invalid = "ignore"): ##With transient = 0 the lanes start at tau = 0
+        for i in range(keep):
+            taus[:, i] = x
+            x = f(x, records)
+    return taus.reshape(nParams, nIc, keep)
+
+@cached()
+def orbitDensity(kind, axisParam, values, fixedParams, yRange, yBins = 800, nIc = 5, transient = 100, keep = 101, icScale = 2, observable = None,
+                 dtype = "float64"):
+    '''
+    Accumulates the orbit diagram straight into a (yBins, len(values)) raster of visit counts, one column per value
+    Points are binned as they are generated and never stored, so memory depends on the raster size only
+    observable(tau, value) gives the plotted quantity, tau itself by default (fig2 plots gamma*tau)
+    dtype = "float32" iterates in single precision
+    '''
+    f = getMap(kind)
+    records, p1 = diagramRecords(f, axisParam, values, fixedParams)
+    nParams = len(records)
+    tau0 = np.outer(icScale*p1, np.linspace(0, 1, nIc) if nIc > 1 else [0.0])
+    records = np.repeat(records, nIc, axis = 0).astype(dtype)
+    laneColumn = np.repeat(np.arange(nParams), nIc)
+    laneValue = np.repeat(np.asarray(values, dtype = float), nIc)
+    yMin, yMax = yRange
+    counts = np.zeros(yBins*nParams, dtype = np.int64)
+    x = iterateMap(f, tau0.ravel(), records, transient, dtype = dtype)
+    for i in range(keep):
+        y = x if observable is None else observable(x, laneValue)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            row = np.floor((y - yMin)/(yMax - yMin)*yBins)
+            inside = (row >= 0) & (row < yBins)
+            counts += np.bincount(row[inside].astype(np.int64)*nParams + laneColumn[inside], minlength = counts.size)
+            x = f(x, records)
+    return counts.reshape(yBins, nParams)
+
+def toneMap(counts, mode = "alpha", alpha = 0.1):
+    '''
+    Maps visit counts to an ink density in [0,1]
+    "alpha" reproduces stacking n scatter points of the given alpha, 1 - (1 - alpha)^n, "log" scales log(1 + n)
+    '''
+    if mode == "alpha":
+        return 1 - (1 - alpha)**counts
+    if mode == "log":
+        return np.log1p(counts)/max(np.log1p(counts.max()), 1)
+    raise ValueError("Unknown tone mapping {0}, expected alpha or log".format(mode))
+
+def drawDensity(ax, counts, values, yRange, mode = "alpha", alpha = 0.1, cmap = "Greys"):
+    '''
+    Draws an orbitDensity raster with a single imshow, columns centred on evenly spaced values
+    Unevenly spaced values (from adaptiveOrbitDiagram) are drawn with a single pcolormesh, each column reaching
+    halfway to its neighbours
+    '''
+    values = np.asarray(values, dtype = float)
+    step = np.diff(values)
+    if np.allclose(step, step[0]):
+        extent = [values[0] - step[0]/2, values[-1] + step[0]/2, yRange[0], yRange[1]]
+        return ax.imshow(toneMap(counts, mode, alpha), origin = "lower", extent = extent, aspect = "auto",
+                         cmap = cmap, vmin = 0, vmax = 1, interpolation = "nearest")
+    xEdges = np.concatenate([[values[0] - step[0]/2], values[:-1] + step/2, [values[-1] + step[-1]/2]])
+    yEdges = np.linspace(yRange[0], yRange[1], counts.shape[0] + 1)
+    return ax.pcolormesh(xEdges, yEdges, toneMap(counts, mode, alpha), cmap = cmap, vmin = 0, vmax = 1, shading = "flat")
+
+def columnFeatures(kind, taus, records, maxPeriod = 16, tol = 1e-10):
+    '''
+    Summarises each column of an orbitDiagram block for adaptive refinement
+    Returns the attractor spread (max - min over every initial condition), the longest period found among the
+    initial conditions (0 if any lane has none within maxPeriod) and the mean log|f'| over the kept states,
+    a rough Lyapunov exponent whose sign separates chaotic from regular columns
+    '''
+    f = getMap(kind)
+    nValues, nIc, keep = taus.shape
+    spread = taus.max(axis = (1, 2)) - taus.min(axis = (1, 2))
+    lanes = taus.reshape(nValues*nIc, keep)
+    period = findPeriod(lanes, maxPeriod, tol).reshape(nValues, nIc)
+    period = np.where((period == 0).any(axis = 1), 0, period.max(axis = 1))
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        slope = mapAndDeriv(f)(lanes, np.repeat(records, nIc, axis = 0)[:, None, :])[1]
+        lyExp = np.log(np.abs(slope)).reshape(nValues, nIc*keep).mean(axis = 1)
+    return spread, period, lyExp
+
+@cached(depends = ("cycleDetection",))
+def adaptiveOrbitDiagram(kind, axisParam, bounds, fixedParams, budget = 1000, nStart = 65, pixels = None, spreadTol = 0.02,
+                         nIc = 5, transient = 100, keep = 101, icScale = 2, dtype = "float64"):
+    '''
+    Orbit diagram on a parameter grid refined where the attractor changes, returning the sorted values and their
+    (len(values), nIc, keep) orbit block
+    Starts from nStart evenly spaced values over bounds and bisects every interval whose end columns differ in period,
+    in the sign of the Lyapunov estimate, or in spread by more than spreadTol of the largest spread. Widest intervals
+    are split first and all midpoints of a round are iterated as one ensemble. Once every transition is resolved the
+    remaining budget goes to the widest intervals with the largest spread (the chaotic bands)
+    pixels is the width of the rendered image in columns (budget by default). Midpoints are snapped to pixel centres
+    and never share a pixel with a column already on the grid, so the grid can only beat a uniform one of the same
+    budget when pixels is larger than budget
+    With dtype = "float32" cycles are matched to a relative 1e-5 instead of 1e-10
+    '''
+    periodTol = 1e-10 if np.dtype(dtype) == np.float64 else 1e-5
+    f = getMap(kind)
+    values = np.linspace(bounds[0], bounds[1], nStart)
+    taus = orbitDiagram(f, axisParam, values, fixedParams, nIc, transient, keep, icScale, dtype = dtype)
+    features = columnFeatures(f, taus, diagramRecords(f, axisParam, values, fixedParams)[0], tol = periodTol)
+    pixels = pixels or budget
+    pixelWidth = (bounds[1] - bounds[0])/pixels
+    while len(values) < budget:
+        spread, period, lyExp = features
+        changed = (np.diff(period) != 0) | (np.diff(np.sign(lyExp)) != 0)
+        changed |= np.abs(np.diff(spread)) > spreadTol*max(spread.max(), tauFloor)
+        width = np.diff(values)
+        cell = np.minimum(np.floor((values - bounds[0])/pixelWidth), pixels - 1)
+        splittable = np.diff(cell) >= 2 ##A free pixel lies between the two columns
+        split = np.flatnonzero(changed & splittable)
+        priority = width
+        if not split.size: ##Every transition is resolved, spend what is left on the widest high-spread intervals
+            split = np.flatnonzero(splittable)
+            priority = width*np.maximum(spread[:-1], spread[1:])
+        if not split.size:
+            break
+        split = split[np.argsort(-priority[split], kind = "stable")][:budget - len(values)]
+        newValues = bounds[0] + (np.floor((cell[split] + cell[split + 1])/2) + 0.5)*pixelWidth
+        newTaus = orbitDiagram(f, axisParam, newValues, fixedParams, nIc, transient, keep, icScale, dtype = dtype)
+        newFeatures = columnFeatures(f, newTaus, diagramRecords(f, axisParam, newValues, fixedParams)[0], tol = periodTol)
+        order = np.argsort(np.concatenate([values, newValues]), kind = "stable")
+        values = np.concatenate([values, newValues])[order]
+        taus = np.concatenate([taus, newTaus])[order]
+        features = tuple(np.concatenate([old, new])[order] for old, new in zip(features, newFeatures))
+    return values, taus
+
+def binOrbits(taus, values, yRange, yBins = 800, observable = None):
+    '''
+    Bins an orbit block such as the one from adaptiveOrbitDiagram into the (yBins, len(values)) raster of orbitDensity
+    '''
+    nValues, nIc, keep = taus.shape
+    y = taus if observable is None else observable(taus, np.asarray(values, dtype = float)[:, None, None])
+    yMin, yMax = yRange
+    with np.errstate(invalid = "ignore"):
+        row = np.floor((y - yMin)/(yMax - yMin)*yBins)
+        inside = (row >= 0) & (row < yBins)
+    column = np.broadcast_to(np.arange(nValues)[:, None, None], taus.shape)
+    counts = np.bincount(row[inside].astype(np.int64)*nValues + column[inside], minlength = yBins*nValues)
+    return counts.reshape(yBins, nValues)
@@ -0,0 +1,196 @@
+import numpy as np
+import os
+from pointStore import appendStore, createStore, isStore, loadPoints, openStore
+
+##Voxel grid index over chaotic point datasets
+##Each axis is normalised by the sampling box to [0,1] and cut into grid cells. Points are stored sorted by cell
+##(p1 slowest, p3 fastest) in a .cpts store next to the data, with a .npy of cell offsets, so the points of cell c
+##are rows offsets[c]:offsets[c+1] and a run of cells along p3 is one contiguous slice of the memory map.
+##Queries only read the cells they touch, so they stay fast however many points the dataset holds
+
+pointsPerCell = 8 ##Average occupancy aimed for when choosing the grid size
+maxGrid = 256
+
+def indexFiles(filename):
+    '''
+    Names of the sorted point store and the offsets array of the index of filename
+    '''
+    base = filename[:-len(".cpts")] if isStore(filename) else os.path.splitext(filename)[0]
+    return base + ".index.cpts", base + ".index.npy"
+
+def normalise(points, box):
+    '''
+    Maps (p1,p2,p3) rows to the unit cube of the sampling box
+    '''
+    box = np.asarray(box, dtype = float)
+    return (np.asarray(points, dtype = float)[..., :3] - box[:, 0])/(box[:, 1] - box[:, 0])
+
+def cellCoords(unit, grid):
+    '''
+    Integer (i,j,k) cell of points in the unit cube, points on or outside the faces going to the edge cells
+    '''
+    return np.clip(np.floor(unit*grid).astype(np.int64), 0, grid - 1)
+
+def cellIds(unit, grid):
+    '''
+    Flat cell number of points in the unit cube
+    '''
+    cell = cellCoords(unit, grid)
+    return (cell[..., 0]*grid + cell[..., 1])*grid + cell[..., 2]
+
+def buildIndex(filename, box = None, grid = None):
+    '''
+    Builds and saves the index of a point file (text or store), returning it as from openIndex
+    box defaults to the box in a store's header, else the bounding box of the points. grid defaults to about
+    pointsPerCell points per cell
+    '''
+    points = np.asarray(loadPoints(filename))
+    header = openStore(filename)[0] if isStore(filename) else {}
+    if box is None:
+        box = header.get("box") or np.column_stack([points[:, :3].min(axis = 0), points[:, :3].max(axis = 0)])
+    box = np.asarray(box, dtype = float).tolist()
+    if grid is None:
+        grid = int(np.clip(np.ceil((len(points)/pointsPerCell)**(1/3)), 1, maxGrid))
+    ids = cellIds(normalise(points, box), grid)
+    order = np.argsort(ids, kind = "stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength = grid**3))])
+    storeFile, offsetFile = indexFiles(filename)
+    createStore(storeFile, len(points), {"kind": header.get("kind"), "box": box, "grid": grid, "source": os.path.basename(filename)})
+    for start in range(0, len(points), 1000000): ##Gather in blocks so the sorted copy never sits in memory whole
+        appendStore(storeFile, points[order[start:start+1000000]])
+    np.save(offsetFile, offsets)
+    return openIndex(filename)
+
+def openIndex(filename):
+    '''
+    Opens the saved index of filename as a dict of header, box (3,2), grid, offsets and the sorted (m,4) points
+    Both arrays are memory mapped, so opening is instant
+    '''
+    storeFile, offsetFile = indexFiles(filename)
+    header, data = openStore(storeFile)
+    return {"header": header, "box": np.asarray(header["box"]), "grid": header["grid"],
+            "offsets": np.load(offsetFile, mmap_mode = "r"), "points": data.T}
+
+def cellRange(index, cellLow, cellHigh):
+    '''
+    Rows of every point in the cells cellLow to cellHigh inclusive, gathered one p3 run at a time
+    '''
+    grid, offsets = index["grid"], index["offsets"]
+    cellLow = np.maximum(cellLow, 0)
+    cellHigh = np.minimum(cellHigh, grid - 1)
+    if np.any(cellHigh < cellLow):
+        return np.empty((0, 4))
+    i, j = np.meshgrid(np.arange(cellLow[0], cellHigh[0] + 1), np.arange(cellLow[1], cellHigh[1] + 1), indexing = "ij")
+    first = (i.ravel()*grid + j.ravel())*grid + cellLow[2]
+    last = (i.ravel()*grid + j.ravel())*grid + cellHigh[2]
+    starts, stops = offsets[first], offsets[last + 1]
+    rows = [index["points"][start:stop] for start, stop in zip(starts, stops) if stop > start]
+    return np.concatenate(rows) if rows else np.empty((0, 4))
+
+def boxQuery(index, low, high):
+    '''
+    Every point with low <= (p1,p2,p3) <= high, as an (m,4) array of p1,p2,p3,lyExp
+    '''
+    low, high = np.asarray(low, dtype = float), np.asarray(high, dtype = float)
+    grid = index["grid"]
+    cellLow = np.floor(normalise(low, index["box"])*grid).astype(np.int64)
+    cellHigh = np.floor(normalise(high, index["box"])*grid).astype(np.int64)
+    edge = np.full(3, grid - 1)
+    ##Points outside the box were filed in the edge cells, so queries reaching past a face must include them
+    cellLow = np.where(cellLow >= grid, edge, cellLow)
+    cellHigh = np.where(cellHigh < 0, 0, cellHigh)
+    candidates = cellRange(index, cellLow, cellHigh)
+    inside = np.all((candidates[:, :3] >= low) & (candidates[:, :3] <= high), axis = 1)
+    return candidates[inside]
+
+def nearest(index, point, k = 8):
+    '''
+    The k nearest points to point in box normalised distance, returned as (points (k,4), distances (k,)) sorted by distance
+    Shells of cells are added around the query cell until the k-th distance is inside the searched region
+    '''
+    grid = index["grid"]
+    unit = normalise(point, index["box"])
+    centre = cellCoords(unit, grid)
+    k = min(k, int(index["offsets"][-1]))
+    if k == 0:
+        return np.empty((0, 4)), np.empty(0)
+    radius = 0
+    while True:
+        candidates = cellRange(index, centre - radius, centre + radius)
+        searched = np.all(centre - radius <= 0) and np.all(centre + radius >= grid - 1)
+        if len(candidates) >= k:
+            distance = np.sqrt(np.sum((normalise(candidates, index["box"]) - unit)**2, axis = 1))
+            order = np.argsort(distance)[:k]
+            ##Everything closer than the nearest face of the searched cells that is not a face of the grid has been seen
+            below = np.where(centre - radius <= 0, np.inf, unit*grid - (centre - radius))
+            above = np.where(centre + radius >= grid - 1, np.inf, centre + radius + 1 - unit*grid)
+            reach = np.min(np.minimum(below, above))/grid
+            if searched or distance[order[-1]] <= reach:
+                return candidates[order], distance[order]
+        radius += 1
+
+def interpolateLyapunov(index, point, k = 8, power = 2):
+    '''
+    Inverse distance weighted lyExp from the k nearest chaotic points, returning (estimate, distance to the nearest)
+    Only chaotic points are indexed, so a large distance means point is probably not chaotic at all
+    '''
+    neighbours, distance = nearest(index, point, k)
+    if not len(neighbours):
+        return np.nan, np.inf
+    if distance[0] == 0:
+        return neighbours[0, 3], 0.0
+    weight = distance**-power
+    return np.sum(weight*neighbours[:, 3])/np.sum(weight), distance[0]
+
+def occupiedCells(points, box, grid):
+    '''
+    Sorted unique cells of a grid over box holding at least one point, points outside box being dropped
+    '''
+    unit = normalise(points, box)
+    inside = np.all((unit >= 0) & (unit <= 1), axis = 1)
+    return np.unique(cellIds(unit[inside], grid))
+
+def overlap(indexA, indexB, grid = 64):
+    '''
+    Compares where two datasets (e.g. Map B and Map C) are chaotic on a common grid over the intersection of their boxes
+    Returns (cells chaotic in A, in B, in both, Jaccard index of the two cell sets)
+    '''
+    box = np.column_stack([np.maximum(indexA["box"][:, 0], indexB["box"][:, 0]), np.minimum(indexA["box"][:, 1], indexB["box"][:, 1])])
+    if np.any(box[:, 1] <= box[:, 0]):
+        return 0, 0, 0, 0.0
+    cells = [np.concatenate([occupiedCells(index["points"][start:start+1000000], box, grid)
+                             for start in range(0, max(len(index["points"]), 1), 1000000)]) for index in (indexA, indexB)]
+    cellsA, cellsB = (np.unique(c) for c in cells)
+    both = len(np.intersect1d(cellsA, cellsB, assume_unique = True))
+    union = len(cellsA) + len(cellsB) - both
+    return len(cellsA), len(cellsB), both, both/union if union else 0.0
+
+def voxelSummary(points, box, grid = 64, blockSize = 1000000):
+    '''
+    Level of detail reduction of an (m,4) array of points to one point per occupied voxel of a grid over box
+    Returns an (occupied voxels, 5) array of mean p1, p2, p3, mean lyExp and count, read in blocks so a memory
+    mapped store is never loaded whole
+    '''
+    sums = np.zeros((grid**3, 4))
+    counts = np.zeros(grid**3)
+    for start in range(0, len(points), blockSize):
+        block = np.asarray(points[start:start+blockSize], dtype = float)
+        ids = cellIds(normalise(block, box), grid)
+        counts += np.bincount(ids, minlength = grid**3)
+        for column in range(4):
+            sums[:, column] += np.bincount(ids, block[:, column], minlength = grid**3)
+    occupied = counts > 0
+    return np.column_stack([sums[occupied]/counts[occupied, None], counts[occupied]])
+
+def voxelSubsample(points, box, grid = 64, perVoxel = 4, seed = 0):
+    '''
+    Level of detail reduction keeping at most perVoxel randomly chosen points of every voxel of a grid over box
+    Dense regions are thinned while sparse ones keep every point, so the outline of the locus survives
+    Returns the kept rows of points in their original order
+    '''
+    ids = cellIds(normalise(points, box), grid)
+    order = np.argsort(ids + np.random.default_rng(seed).random(len(ids))) ##Random order within each voxel
+    sortedIds = ids[order]
+    first = np.searchsorted(sortedIds, sortedIds, side = "left")
+    keep = order[np.arange(len(order)) - first < perVoxel]
+    return np.asarray(points)[np.sort(keep)]
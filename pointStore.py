@@ -0,0 +1,127 @@
+import numpy as np
+import json
+import os
+
+##Binary columnar store for chaotic point datasets
+##Layout: magic | count (uint64) | capacity (uint64) | header length (uint32) | JSON header | padding to 64 bytes |
+##one column of capacity values per field. Columns are contiguous so a single field can be memory mapped and sliced
+##without touching the others, and count is updated in place so the sweep can append to a preallocated file
+
+storeSuffix = ".cpts"
+magic = b"CHAOSPT1"
+prefixSize = len(magic) + 8 + 8 + 4
+alignment = 64
+defaultColumns = ["p1", "p2", "p3", "lyExp"]
+
+def isStore(filename):
+    '''
+    True if filename names a binary store rather than a text file
+    '''
+    return str(filename).endswith(storeSuffix)
+
+def readPrefix(file):
+    '''
+    Reads the fixed prefix and JSON header, returning (count, capacity, header, data offset)
+    '''
+    if file.read(len(magic)) != magic:
+        raise ValueError("{0} is not a chaotic point store".format(file.name))
+    count, capacity = np.frombuffer(file.read(16), dtype = "<u8")
+    headerLength = int(np.frombuffer(file.read(4), dtype = "<u4")[0])
+    header = json.loads(file.read(headerLength).decode())
+    offset = -(-(prefixSize + headerLength)//alignment)*alignment
+    return int(count), int(capacity), header, offset
+
+def createStore(filename, capacity, header, dtype = "float64"):
+    '''
+    Creates an empty store with room for capacity rows
+    header is a dict of metadata (map kind, p4, sampling box, iteration counts...), columns defaults to p1,p2,p3,lyExp
+    The column area is allocated by extending the file, which stays sparse on disk until written
+    '''
+    header = dict(header)
+    header.setdefault("columns", defaultColumns)
+    header["dtype"] = np.dtype(dtype).str
+    encoded = json.dumps(header).encode()
+    offset = -(-(prefixSize + len(encoded))//alignment)*alignment
+    with open(filename, "wb") as file:
+        file.write(magic)
+        file.write(np.array([0, capacity], dtype = "<u8").tobytes())
+        file.write(np.array([len(encoded)], dtype = "<u4").tobytes())
+        file.write(encoded)
+        file.truncate(offset + capacity*len(header["columns"])*np.dtype(dtype).itemsize)
+
+def storeHeader(filename):
+    '''
+    Metadata of a store without mapping its data, less the columns and dtype that createStore fills in
+    '''
+    with open(filename, "rb") as file:
+        header = readPrefix(file)[2]
+    header.pop("columns", None)
+    header.pop("dtype", None)
+    return header
+
+def setCount(filename, count):
+    '''
+    Sets the number of valid rows, used to commit appended rows or roll back to a checkpoint
+    '''
+    with open(filename, "r+b") as file:
+        file.seek(len(magic))
+        file.write(np.array([count], dtype = "<u8").tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+
+def openStore(filename, mode = "r"):
+    '''
+    Memory maps a store and returns (header, data) where data is a (columns, count) view
+    Nothing is read until it is sliced, so even very large stores open instantly
+    '''
+    with open(filename, "rb") as file:
+        count, capacity, header, offset = readPrefix(file)
+    header["count"] = count
+    shape = (len(header["columns"]), capacity)
+    if capacity == 0:
+        return header, np.empty(shape, dtype = header["dtype"])
+    data = np.memmap(filename, dtype = header["dtype"], mode = mode, offset = offset, shape = shape)
+    return header, data[:, :count]
+
+def appendStore(filename, points):
+    '''
+    Appends an (m, columns) array of rows, writing the data before committing the new count
+    '''
+    points = np.asarray(points)
+    with open(filename, "rb") as file:
+        count, capacity, header, offset = readPrefix(file)
+    if count + len(points) > capacity:
+        raise ValueError("Store {0} has room for {1} more rows, cannot append {2}".format(filename, capacity - count, len(points)))
+    if len(points):
+        data = np.memmap(filename, dtype = header["dtype"], mode = "r+", offset = offset, shape = (len(header["columns"]), capacity))
+        data[:, count:count+len(points)] = points.T
+        data.flush()
+        del data
+    setCount(filename, count + len(points))
+    return count + len(points)
+
+def writeStore(filename, points, header, dtype = "float64"):
+    '''
+    Writes an (m, columns) array as a complete store
+    '''
+    createStore(filename, len(points), header, dtype)
+    appendStore(filename, points)
+
+def loadPoints(filename):
+    '''
+    Loads p1,p2,p3,lyExp rows from either a text file or a store as an (m,4) array
+    For stores this is a zero-copy transposed view of the memory map
+    '''
+    if isStore(filename):
+        return openStore(filename)[1].T
+    if os.path.getsize(filename) == 0:
+        return np.empty((0, 4))
+    return np.loadtxt(filename, delimiter = ',', ndmin = 2)
+
+def convertText(textFile, storeFile, kind, p4 = 0.5, box = None, transient = None, n = None, dtype = "float64"):
+    '''
+    Converts a p1,p2,p3,lyExp text file such as chaoticPointsMC2.txt into a store
+    The header records what the text format leaves implicit: map kind, p4, sampling box and iteration counts
+    '''
+    header = {"kind": kind, "p4": p4, "box": box, "transient": transient, "n": n, "source": os.path.basename(textFile)}
+    writeStore(storeFile, loadPoints(textFile), header, dtype)
@@ -0,0 +1,170 @@
+import numpy as np
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+##Content addressed on-disk cache of expensive results (Lyapunov exponents, orbit diagrams, time series)
+##A result is stored under the SHA-256 of the function, its bound arguments (arrays hashed by dtype, shape and
+##bytes, maps by name) and a kernel version covering the source of mapKernels.py, the function's own module and
+##any modules it names in depends, so editing a kernel invalidates everything computed with it. Hits refresh the
+##file time, and once the cache grows past maxBytes the least recently used entries are deleted. Calls with
+##arguments that cannot be hashed reliably (lambdas, arbitrary objects) are simply computed
+##Only the outermost cached call touches the disk: cached functions called inside it (lyapunovBatch inside
+##lyapunovMixedBatch, say) are computed directly, as is everything run under uncached()
+
+cacheDir = os.environ.get("MAP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mapCache"))
+maxBytes = int(os.environ.get("MAP_CACHE_BYTES", 2**30)) ##1 GiB
+enabled = os.environ.get("MAP_CACHE", "1") != "0"
+kernelVersion = 1 ##Bump to invalidate every entry by hand
+cacheBytes = None ##Size of the cache at the last scan plus what this process has stored since, None before the first store
+depth = 0 ##Cached calls and uncached() blocks in progress, nothing is read or stored while it is above 0
+
+@functools.lru_cache(maxsize = None)
+def sourceHash(moduleName):
+    '''
+    Hash of the source file of a loaded module, empty if it has none
+    '''
+    filename = getattr(sys.modules.get(moduleName), "__file__", None)
+    if filename is None:
+        return ""
+    with open(filename, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def canonical(value):
+    '''
+    JSON friendly stand-in for an argument, raising TypeError for values without a stable identity
+    '''
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if isinstance(value, np.random.SeedSequence):
+        return {"entropy": str(value.entropy), "spawnKey": list(value.spawn_key)}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        array = np.asarray(value)
+        if array.dtype == object:
+            return [canonical(item) for item in value]
+        array = np.ascontiguousarray(array)
+        return {"dtype": array.dtype.str, "shape": array.shape, "sha": hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, dict):
+        return {str(key): canonical(value[key]) for key in sorted(value)}
+    if callable(value) and "<" not in value.__qualname__: ##Named module level functions (the maps), not lambdas
+        return value.__module__ + "." + value.__qualname__
+    raise TypeError("Cannot hash a {0} argument".format(type(value).__name__))
+
+def resultKey(fn, arguments, depends = ()):
+    '''
+    Cache key of fn called with a dict of bound arguments, covering the source of the modules named in depends
+    '''
+    description = {"function": fn.__module__ + "." + fn.__qualname__, "arguments": canonical(arguments),
+                   "kernels": [sourceHash("mapKernels"), sourceHash(fn.__module__)] + [sourceHash(name) for name in depends],
+                   "version": kernelVersion}
+    return hashlib.sha256(json.dumps(description, sort_keys = True).encode()).hexdigest()
+
+def load(key):
+    '''
+    Cached result for key, or None. A tuple result was stored with its items as arr_0, arr_1...
+    '''
+    filename = os.path.join(cacheDir, key + ".npz")
+    try:
+        with np.load(filename) as data:
+            items = [data["arr_{0}".format(i)] for i in range(len(data.files) - 1)]
+            isTuple = bool(data["isTuple"])
+        os.utime(filename) ##Mark as recently used
+    except (OSError, KeyError, ValueError):
+        return None
+    items = [item[()] if item.ndim == 0 else item for item in items]
+    return tuple(items) if isTuple else items[0]
+
+def store(key, result):
+    '''
+    Writes a result atomically. The directory is only scanned for eviction on the first store and when the
+    running size estimate passes maxBytes, not on every store
+    '''
+    global cacheBytes
+    os.makedirs(cacheDir, exist_ok = True)
+    filename = os.path.join(cacheDir, key + ".npz")
+    temp = "{0}.{1}.tmp.npz".format(filename[:-4], os.getpid())
+    items = result if isinstance(result, tuple) else (result,)
+    np.savez(temp, *items, isTuple = isinstance(result, tuple))
+    os.replace(temp, filename)
+    size = os.path.getsize(filename)
+    if cacheBytes is None or cacheBytes + size > maxBytes:
+        cacheBytes = evict()
+    else:
+        cacheBytes += size
+
+def evict():
+    '''
+    Deletes the least recently used entries until the cache fits in maxBytes and returns the size left
+    '''
+    entries = []
+    for entry in os.scandir(cacheDir):
+        if entry.name.endswith(".npz") and not entry.name.endswith(".tmp.npz"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+    return total
+
+def clearCache():
+    '''
+    Deletes every cached result
+    '''
+    global cacheBytes
+    cacheBytes = 0
+    if os.path.isdir(cacheDir):
+        for entry in os.scandir(cacheDir):
+            if entry.name.endswith(".npz"):
+                os.remove(entry.path)
+
+@contextlib.contextmanager
+def uncached():
+    '''
+    Runs the enclosed calls without reading or writing the cache, for bulk work such as the shards of a sweep
+    '''
+    global depth
+    depth += 1
+    try:
+        yield
+    finally:
+        depth -= 1
+
+def cached(ignore = ("chunkSize",), depends = ()):
+    '''
+    Decorator routing calls through the cache, arguments named in ignore (which only affect speed) left out of the key
+    depends names the modules besides mapKernels and its own whose source the result depends on
+    Results must be arrays, scalars or tuples of them
+    '''
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled or depth:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name not in ignore}
+            try:
+                key = resultKey(fn, arguments, depends)
+            except TypeError:
+                return fn(*args, **kwargs)
+            result = load(key)
+            if result is None:
+                with uncached():
+                    result = fn(*args, **kwargs)
+                store(key, result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,58 @@
+import numpy as np
+
+##Samplers of the unit cube for the chaos sweep
+##Every sampler takes (root SeedSequence, shard SeedSequence, index of the shard's first point, n, dimensions) and
+##returns an (n, dimensions) array in [0,1). The uniform sampler draws from the shard's own generator as before.
+##The low discrepancy samplers instead hand each shard a contiguous block of one scrambled sequence, seeded from the
+##root, so the union of all shards is the same sequence whatever the shard size or number of workers.
+##The chaotic volume fraction is the mean of an indicator function with a fractal boundary, not a smooth integrand,
+##so their error on it falls only as roughly N^-1/2 to N^-2/3 in three dimensions rather than the 1/N of smooth
+##integrands: a modest gain over the N^-1/2 of i.i.d. points, mostly a smaller constant
+
+try:
+    from scipy.stats import qmc
+    haveQmc = True
+except ImportError:
+    haveQmc = False
+
+def uniformSample(rootSeed, shardSeed, start, n, dim):
+    '''
+    Independent uniform points from the shard's generator
+    '''
+    return np.random.default_rng(shardSeed).random((n, dim))
+
+def sequenceSample(engine, rootSeed, start, n, dim):
+    '''
+    Points start to start+n-1 of a scrambled scipy.stats.qmc sequence, the scrambling fixed by the root seed
+    '''
+    if not haveQmc:
+        raise ImportError("Sobol and Halton sampling need scipy.stats.qmc (scipy >= 1.7)")
+    sequence = getattr(qmc, engine)(dim, scramble = True, seed = np.random.default_rng(rootSeed.generate_state(4))) ##Not the root itself, whose spawn count changes
+    if start:
+        sequence.fast_forward(start)
+    return sequence.random(n)
+
+def sobolSample(rootSeed, shardSeed, start, n, dim):
+    '''
+    Owen scrambled Sobol points, balanced only for a total sample count that is a power of 2
+    scipy warns when the first shard is not a power of 2, so use one for the shard size as well
+    '''
+    return sequenceSample("Sobol", rootSeed, start, n, dim)
+
+def haltonSample(rootSeed, shardSeed, start, n, dim):
+    '''
+    Scrambled Halton points, usable for any sample count
+    '''
+    return sequenceSample("Halton", rootSeed, start, n, dim)
+
+samplers = {"uniform": uniformSample, "sobol": sobolSample, "halton": haltonSample}
+
+def getSampler(sampler):
+    '''
+    Looks a sampler up by name, passing functions through unchanged
+    '''
+    if callable(sampler):
+        return sampler
+    if sampler not in samplers:
+        raise ValueError("Unknown sampler {0}, expected one of {1}".format(sampler, ", ".join(samplers)))
+    return samplers[sampler]
@@ -0,0 +1,113 @@
+import numpy as np
+from mapKernels import ensemble, getMap, iterateMap, mapAndDeriv
+from invariantDensity import binEdges, binIndex, gammaTau
+from resultCache import cached
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparseLinalg
+    haveScipy = True
+except ImportError:
+    haveScipy = False
+
+##Invariant density and Lyapunov exponent from the transfer operator (Ulam's method)
+##The tau interval holding the attractor is cut into cells and samplesPerCell points spread evenly over each cell
+##are mapped in one vectorized call. The fraction of cell i landing in cell j is the (i,j) entry of a sparse Markov
+##matrix, whose eigenvector for eigenvalue 1 approximates the invariant density. lambda is then the average of
+##log|f'| over the samples of each cell weighted by that density, with no orbit to converge. Mass mapped out of
+##the interval is reported as the leak. The cell averaging acts as a small noise: where the orbit is strongly
+##contracted or intermittent (fig13) lambda can be off by a few hundredths without improving steadily with more
+##cells, and a narrow periodic window can be washed out altogether, flipping the sign. It suits smooth chaotic
+##densities; validation.py reports it against the orbit averages
+
+def attractorRange(kind, p, lanes = 256, transient = 1000, steps = 200):
+    '''
+    Interval visited by lanes orbits after transient steps, widened by 2% on each side (at least 1e-3 of its top)
+    '''
+    f = getMap(kind)
+    p = np.asarray(p, dtype = float).ravel()
+    with np.errstate(divide = "ignore"):
+        top = float(f(0.0, p))
+    x = iterateMap(f, 2*top*np.random.default_rng(0).random(lanes), p, transient)
+    low, high = x.min(), x.max()
+    for i in range(steps):
+        x = f(x, p)
+        low, high = min(low, x.min()), max(high, x.max())
+    margin = 0.02*max(high - low, 1e-3*high)
+    return max(low - margin, 0.0), high + margin
+
+def ulamOperator(kind, p, cells = 2000, samplesPerCell = 64, tauRange = None, scale = "linear", seed = 0):
+    '''
+    Builds the Ulam transfer matrix of one parameter record over cells cells of tauRange (attractorRange by default)
+    Sample points are stratified within each cell. Returns a dict of edges, the sparse (cells, cells) matrix, the
+    (cells, samplesPerCell) sample points and their log|f'|, and the leak (fraction of samples mapped out)
+    '''
+    if not haveScipy:
+        raise ImportError("The transfer operator needs scipy.sparse")
+    f = getMap(kind)
+    p = np.asarray(p, dtype = float).ravel()
+    edges = binEdges(attractorRange(f, p) if tauRange is None else tauRange, cells, scale)
+    offset = (np.arange(samplesPerCell) + np.random.default_rng(seed).random((cells, samplesPerCell)))/samplesPerCell
+    x = edges[:-1, None] + offset*np.diff(edges)[:, None]
+    tau, records = ensemble(x, p)
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        image, slope = mapAndDeriv(f)(tau, records)
+        logSlope = np.log(np.abs(slope)).reshape(cells, samplesPerCell)
+    target = binIndex(image, edges, scale)
+    inside = (target >= 0) & (target < cells)
+    source = np.repeat(np.arange(cells), samplesPerCell)
+    matrix = sparse.csr_matrix((np.full(np.count_nonzero(inside), 1/samplesPerCell), (source[inside], target[inside].astype(np.int64))),
+                               shape = (cells, cells)) ##Duplicate (i,j) entries are summed
+    return {"kind": f.__name__, "record": p, "scale": scale, "edges": edges, "matrix": matrix, "samples": x, "logSlope": logSlope,
+            "leak": 1 - np.count_nonzero(inside)/inside.size}
+
+def ulamWeights(operator):
+    '''
+    Invariant measure of every cell, the left eigenvector of the transfer matrix for the eigenvalue closest to 1,
+    normalised to sum to 1
+    '''
+    matrix = operator["matrix"].T.tocsr()
+    cells = matrix.shape[0]
+    if cells <= 8: ##Too small for ARPACK
+        values, vectors = np.linalg.eig(matrix.toarray())
+    else:
+        values, vectors = sparseLinalg.eigs(matrix, k = min(6, cells - 2), which = "LM", v0 = np.full(cells, 1/cells))
+    weights = np.abs(np.real(vectors[:, np.argmin(np.abs(values - 1))]))
+    return weights/weights.sum()
+
+def ulamDensity(operator, weights = None):
+    '''
+    Cell edges and the invariant probability density per unit tau
+    '''
+    weights = ulamWeights(operator) if weights is None else weights
+    return operator["edges"], weights/np.diff(operator["edges"])
+
+def ulamLyapunov(operator, weights = None):
+    '''
+    lambda as the mean of log|f'| over the samples of each cell, weighted by the invariant measure
+    '''
+    weights = ulamWeights(operator) if weights is None else weights
+    logSlope = operator["logSlope"]
+    finite = np.isfinite(logSlope) ##log|f'| = -inf where the slope vanishes, e.g. at the top of the hump
+    cellMean = np.where(finite, logSlope, 0).sum(axis = 1)/np.maximum(finite.sum(axis = 1), 1)
+    return float(np.sum(weights*cellMean))
+
+def ulamHistogram(operator, edges, weights = None, observable = "gammaTau"):
+    '''
+    Invariant density of tau or gamma*tau on any bin edges, each sample point carrying its cell's measure
+    Returns the probability density per unit of the observable on edges
+    '''
+    weights = ulamWeights(operator) if weights is None else weights
+    x = operator["samples"]
+    values = x if observable == "tau" else gammaTau(getMap(operator["kind"]), x, operator["record"])
+    mass = np.broadcast_to((weights/x.shape[1])[:, None], x.shape)
+    return np.histogram(values.ravel(), edges, weights = mass.ravel())[0]/np.diff(edges)
+
+@cached(depends = ("invariantDensity",))
+def ulamEstimate(kind, p, cells = 2000, samplesPerCell = 64, tauRange = None, scale = "linear", seed = 0):
+    '''
+    Lyapunov exponent, cell edges and invariant density of one parameter record from a single sparse eigen-solve
+    '''
+    operator = ulamOperator(kind, p, cells, samplesPerCell, tauRange, scale, seed)
+    weights = ulamWeights(operator)
+    edges, density = ulamDensity(operator, weights)
+    return ulamLyapunov(operator, weights), edges, density
@@ -0,0 +1,218 @@
+import numpy as np
+import argparse
+import json
+import time
+import resultCache
+import jitKernels
+from mapKernels import fusedMap, getMap, haveNumexpr, lyapunovAdaptiveBatch, lyapunovBatch, lyapunovExp, lyapunovMixedBatch, nDeriv, orbit, parameterRecords
+from cycleDetection import lyapunovCycleBatch
+from pointStore import loadPoints
+from transferOperator import haveScipy, ulamEstimate
+
+##Accuracy against speed for the optimised engines
+##The golden reference is the original scalar loop of the scripts: one Python float per step and the numerical
+##derivative nDeriv. Every engine is run on the same panel (the points of fig6-fig16 and a random sample of
+##chaoticPointsMC2.txt) and compared with it. Chaotic trajectories decorrelate after a few dozen steps whatever
+##the engine, so agreement is statistical: exponents within a tolerance, the same regime (lambda > 0 or not) and
+##close orbit histograms, not identical orbits
+##    python validation.py [--n 10000] [--sample 40] [--output validation.json]
+
+figurePanel = [("B", 0.4, 38, 0.6, "fig7a"), ("B", 0.5, 38, 0.6, "fig7b"), ("B", 0.525, 38, 0.6, "fig7c"), ("B", 0.5702, 38, 0.6, "fig7d"),
+               ("B", 0.8, 38, 0.6, "fig8"), ("B", 0.53356, 38.382, 0.7532, "fig9"), ("B", 0.95, 38, 1.6, "fig13"), ("C", 0.07, 35, 0.6, "fig16"),
+               ("B", 0.25, 38, 0.6, "fig6"), ("B", 1.0, 38, 0.6, "fig6"), ("B", 0.75, 38, 1.6, "fig12"), ("B", 1.1, 38, 1.6, "fig12"),
+               ("C", 0.15, 35, 0.6, "fig15"), ("C", 0.25, 35, 0.6, "fig15")]
+regimeBand = 0.01 ##Reference exponents closer to zero than this are marginal and left out of the regime agreement
+histogramBins = 50
+
+def panel(sample = 40, seed = 0, pointsFile = "./chaoticPointsMC2.txt"):
+    '''
+    The figure points plus sample random rows of a Map B point file, as a list of (kind, record, label)
+    '''
+    rows = [(kind, parameterRecords(kind, p1, p2, p3)[0], label) for kind, p1, p2, p3, label in figurePanel]
+    if sample:
+        points = loadPoints(pointsFile)
+        chosen = np.random.default_rng(seed).choice(len(points), min(sample, len(points)), replace = False)
+        rows += [("B", parameterRecords("B", *points[i, :3])[0], "MC2 row {0}".format(i)) for i in np.sort(chosen)]
+    return rows
+
+##The maps exactly as the scripts defined them before mapKernels, so the reference times the original formulas
+def constantGamma(tau, p):
+    newTau = p[0]*np.exp(-p[1]/((1 + 1/p[2] + (1 - 1/p[2])*np.exp(-p[2]*tau)))**(1/4))
+    return newTau
+
+def pierrehumbert(tau, p):
+    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
+    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (1 - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+def guillot(tau, p):
+    gamma = 10**(p[2]*np.tanh(np.log10(tau)/p[3]))
+    newTau = p[0]*np.exp(-p[1]/((1 + 1/gamma + (gamma - 1/gamma)*np.exp(-gamma*tau)))**(1/4))
+    return newTau
+
+originalMaps = {"constantGamma": constantGamma, "pierrehumbert": pierrehumbert, "guillot": guillot}
+
+def referenceLyapunov(f, x0, args, transient = 300, n = 10000):
+    '''
+    Lyapunov exponent exactly as the scripts originally computed it: scalar steps and a numerical derivative
+    '''
+    f = originalMaps[getMap(f).__name__]
+    args = [float(a) for a in args]
+    x = x0
+    for i in range(transient):
+        x = f(x, args)
+    lyExp = 0
+    for i in range(n):
+        lyExp += np.log(np.abs(nDeriv(f, x, args)))
+        x = f(x, args)
+    return lyExp/n
+
+def referenceOrbit(f, x0, args, n):
+    '''
+    Orbit from the scalar loop of the time series figures, tauArr.append(f(tauArr[i], p))
+    '''
+    f = originalMaps[getMap(f).__name__]
+    args = [float(a) for a in args]
+    tauArr = [x0]
+    for i in range(n):
+        tauArr.append(f(tauArr[i], args))
+    return np.array(tauArr)
+
+##Each engine takes (kind, (m,k) records, transient, n) and returns m exponents
+lyapunovEngines = {
+    "scalar analytic": lambda kind, p, transient, n: np.array([lyapunovExp(kind, 0, list(r), transient, n) for r in p]),
+    "batch": lambda kind, p, transient, n: lyapunovBatch(kind, p, 0, transient, n),
+    "jit": lambda kind, p, transient, n: jitKernels.lyapunovBatch(kind, p, 0, transient, n),
+    "float32": lambda kind, p, transient, n: lyapunovBatch(kind, p, 0, transient, n, dtype = "float32"),
+    "mixed": lambda kind, p, transient, n: lyapunovMixedBatch(kind, p, 0, transient, n)[0],
+    "adaptive": lambda kind, p, transient, n: lyapunovAdaptiveBatch(kind, p, 0, transient, maxIter = n, nearZeroIter = 4*n)[0],
+    "cycle": lambda kind, p, transient, n: lyapunovCycleBatch(kind, p, 0, transient, n)[0]}
+if haveScipy:
+    lyapunovEngines["ulam"] = lambda kind, p, transient, n: np.array([ulamEstimate(kind, r)[0] for r in p])
+
+def fusedOrbit(kind, p, n):
+    '''
+    Orbit through fusedMap, one step per call
+    '''
+    out = np.empty((len(p), n + 1))
+    out[:, 0] = 0
+    for i in range(n):
+        out[:, i+1] = fusedMap(kind, out[:, i], p)
+    return out
+
+##Each engine takes (kind, (m,k) records, n) and returns the (m, n+1) orbits from tau = 0
+orbitEngines = {
+    "orbit": lambda kind, p, n: orbit(kind, 0, p, n),
+    "jit": lambda kind, p, n: jitKernels.orbit(kind, 0, p, n),
+    "float32": lambda kind, p, n: orbit(kind, 0, p, n, dtype = "float32"),
+    "fused": fusedOrbit}
+
+def fusedAgreement(size = 100000, seed = 0):
+    '''
+    Largest relative difference from the plain kernels of each fusedMap path, over random states and records of
+    every map. Where numexpr is installed its path is also compared directly with the blocked numpy one
+    '''
+    rng = np.random.default_rng(seed)
+    tau = np.concatenate([[0.0], 10**rng.uniform(-3, 1, size - 1)]) ##tau = 0 takes the log10(0) branch
+    paths = {"fused numpy": False}
+    if haveNumexpr:
+        paths["fused numexpr"] = True
+    agreement = {name: 0.0 for name in paths}
+    if haveNumexpr:
+        agreement["numexpr vs numpy"] = 0.0
+    for kind in ("A", "B", "C"):
+        p = parameterRecords(kind, rng.uniform(0.05, 1, size), rng.uniform(20, 40, size), rng.uniform(0, 2, size))
+        with np.errstate(divide = "ignore"):
+            plain = getMap(kind)(tau, p)
+        fused = {name: fusedMap(kind, tau, p, useNumexpr = useNumexpr) for name, useNumexpr in paths.items()}
+        for name in paths:
+            agreement[name] = max(agreement[name], float(np.max(np.abs(fused[name] - plain)/np.abs(plain))))
+        if haveNumexpr:
+            difference = np.abs(fused["fused numexpr"] - fused["fused numpy"])/np.abs(fused["fused numpy"])
+            agreement["numexpr vs numpy"] = max(agreement["numexpr vs numpy"], float(np.max(difference)))
+    return agreement
+
+def histogramDistance(reference, other, bins = histogramBins):
+    '''
+    Total variation distance (0 identical, 1 disjoint) between histograms of two orbits on the reference's range
+    '''
+    low, high = reference.min(), reference.max()
+    if high - low < 1e-12*max(abs(high), 1): ##Fixed point, compare positions instead
+        return float(np.abs(other - reference.mean()).max() > 1e-6*max(abs(high), 1))
+    edges = np.linspace(low, high, bins + 1)
+    edges[0], edges[-1] = -np.inf, np.inf
+    a = np.histogram(reference, edges)[0]/len(reference)
+    b = np.histogram(other, edges)[0]/len(other)
+    return 0.5*np.abs(a - b).sum()
+
+def timed(fn, warmUp = None):
+    '''
+    Result of fn and the seconds it took, after calling warmUp (a small run of the same engine) so numba compilation
+    or cache loading is not counted
+    '''
+    if warmUp is not None:
+        warmUp()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def validate(rows, transient = 300, n = 10000, orbitLength = 2000):
+    '''
+    Compares every engine with the scalar reference on the panel rows, grouped by map
+    Returns {"lyapunov": {engine: metrics}, "orbit": {engine: metrics}, "fused": {path: max relative difference},
+    "reference": per row exponents}
+    '''
+    enabled = resultCache.enabled
+    resultCache.enabled = False ##Timings and results must come from the engines themselves
+    try:
+        kinds = sorted(set(kind for kind, _, _ in rows))
+        groups = {kind: np.array([record for k, record, _ in rows if k == kind]) for kind in kinds}
+        reference, refTime = timed(lambda: {kind: np.array([referenceLyapunov(kind, 0, r, transient, n) for r in groups[kind]]) for kind in kinds})
+        refOrbits, refOrbitTime = timed(lambda: {kind: [referenceOrbit(kind, 0, r, orbitLength) for r in groups[kind]] for kind in kinds})
+        report = {"lyapunov": {}, "orbit": {}, "fused": fusedAgreement(), "reference": {kind: reference[kind].tolist() for kind in kinds}}
+        refAll = np.concatenate([reference[kind] for kind in kinds])
+        clear = np.abs(refAll) >= regimeBand
+        for name, engine in lyapunovEngines.items():
+            lyExps, seconds = timed(lambda: np.concatenate([engine(kind, groups[kind], transient, n) for kind in kinds]),
+                                    lambda: [engine(kind, groups[kind][:1], 10, 100) for kind in kinds])
+            difference = np.abs(lyExps - refAll)
+            report["lyapunov"][name] = {"maxDifference": float(np.nanmax(difference)), "medianDifference": float(np.nanmedian(difference)),
+                                        "regimeAgreement": float(np.mean((lyExps[clear] > 0) == (refAll[clear] > 0))),
+                                        "speedup": refTime/seconds}
+        for name, engine in orbitEngines.items():
+            orbits, seconds = timed(lambda: {kind: engine(kind, groups[kind], orbitLength) for kind in kinds},
+                                    lambda: [engine(kind, groups[kind][:1], 100) for kind in kinds])
+            distance = np.array([histogramDistance(refOrbits[kind][i][transient:], np.asarray(orbits[kind][i][transient:], dtype = float))
+                                 for kind in kinds for i in range(len(groups[kind]))])
+            report["orbit"][name] = {"maxHistogramDistance": float(distance.max()), "meanHistogramDistance": float(distance.mean()),
+                                     "speedup": refOrbitTime/seconds}
+    finally:
+        resultCache.enabled = enabled
+    return report
+
+def printReport(report):
+    '''
+    Prints one line per engine: exponent differences, regime agreement and histogram distances with the speedup
+    '''
+    print("{0:18s} {1:>10s} {2:>10s} {3:>8s} {4:>9s}".format("lyapunov engine", "max dlam", "median dlam", "regime", "speedup"))
+    for name, m in report["lyapunov"].items():
+        print("{0:18s} {1:10.2e} {2:10.2e} {3:8.1%} {4:8.1f}x".format(name, m["maxDifference"], m["medianDifference"], m["regimeAgreement"], m["speedup"]))
+    print("{0:18s} {1:>10s} {2:>10s} {3:>8s} {4:>9s}".format("orbit engine", "max TV", "mean TV", "", "speedup"))
+    for name, m in report["orbit"].items():
+        print("{0:18s} {1:10.3f} {2:10.3f} {3:8s} {4:8.1f}x".format(name, m["maxHistogramDistance"], m["meanHistogramDistance"], "", m["speedup"]))
+    print("{0:18s} {1:>10s}".format("fusedMap path", "max rel"))
+    for name, difference in report["fused"].items():
+        print("{0:18s} {1:10.2e}".format(name, difference))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Accuracy and speed of the optimised engines against the scalar reference")
+    parser.add_argument("--n", type = int, default = 10000, help = "Lyapunov iterations after the transient")
+    parser.add_argument("--transient", type = int, default = 300)
+    parser.add_argument("--sample", type = int, default = 40, help = "random rows of chaoticPointsMC2.txt added to the figure points")
+    parser.add_argument("--output", default = None, help = "also save the report as JSON")
+    args = parser.parse_args()
+    report = validate(panel(args.sample), args.transient, args.n)
+    printReport(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent = 1)
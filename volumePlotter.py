@@ -2,8 +2,21 @@ import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import rcParams
-
-chaoticP1, chaoticP2, chaoticP3, lyapunovExponent = np.loadtxt(".\data\chaoticPointsMC.txt", delimiter = ',', unpack = True)
+from pointStore import loadPoints
+from pointIndex import voxelSubsample, voxelSummary
+
+box = [[0, 1], [20, 40], [0, 2]] ##Map B sampling box
+maxPlotPoints = 200000 ##Larger datasets are reduced before plotting
+lod = "voxel" ##"voxel" plots one point per voxel at the mean position and lambda, "subsample" keeps up to perVoxel points per voxel
+lodGrid = 48
+perVoxel = 2
+
+points = loadPoints(".\data\chaoticPointsMC.txt") ##A .cpts store is memory mapped instead of parsed
+if len(points) > maxPlotPoints and lod == "voxel":
+    points = voxelSummary(points, box, lodGrid)[:, :4]
+elif len(points) > maxPlotPoints and lod == "subsample":
+    points = voxelSubsample(points, box, lodGrid, perVoxel)
+chaoticP1, chaoticP2, chaoticP3, lyapunovExponent = np.asarray(points).T
 #data\chaoticPointsGuillot2.txt
 rcParams["axes.linewidth"] = 3
 rcParams["axes.labelsize"] = 19
@@ -36,25 +49,16 @@ textSize = 28
 
     
 def viewAdjustment(theta, phi, chaoticP1, chaoticP2, chaoticP3):
-    alpha = []
+    ##Depth cue: points further from a viewer at distance 1.5 from the centre of the box are drawn more opaque
     viewX = 1.5*np.cos(theta*np.pi/180)*np.cos(phi*np.pi/180)
     viewY = 1.5*np.cos(theta*np.pi/180)*np.sin(phi*np.pi/180)
     viewZ = 1.5*np.sin(theta*np.pi/180)
-    for i in range(len(chaoticP1)):
-                x = chaoticP1[i]
-                y = chaoticP2[i]
-                z = chaoticP3[i]
-                x = x - 0.5
-                y = (y-20)/20 - 0.5
-                z = z/2 - 0.5
-                dist = np.sqrt((viewX-x)**2+(viewY-y)**2+(viewZ-z)**2)
-                alpha.append(dist)
-
-    maxAlpha = max(alpha)
-    minAlpha = min(alpha)
-    for i in range(len(alpha)):
-        alpha[i] = 10**(-(maxAlpha - alpha[i])/maxAlpha)
-    return alpha
+    x = chaoticP1 - 0.5
+    y = (chaoticP2-20)/20 - 0.5
+    z = chaoticP3/2 - 0.5
+    dist = np.sqrt((viewX-x)**2+(viewY-y)**2+(viewZ-z)**2)
+    maxAlpha = dist.max()
+    return 10**(-(maxAlpha - dist)/maxAlpha)
 
 
 ##Plot 1